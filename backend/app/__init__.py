@@ -5,6 +5,7 @@ Core application logic and models for StudyBuddy.
 """
 from .models import (
     FileType,
+    FILE_TYPE_BY_EXTENSION,
     DocumentMetaData,
     UploadResponse,
     QueryRequest,
@@ -19,6 +20,7 @@ from .config import Settings, get_settings
 
 __all__ = [
     "FileType",
+    "FILE_TYPE_BY_EXTENSION",
     "DocumentMetaData", 
     "UploadResponse",
     "QueryRequest",
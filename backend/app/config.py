@@ -2,10 +2,18 @@
 Configuration using Pydantic Settings.
 """
 
-from pydantic_settings import BaseSettings
-from functools import lru_cache
-from pydantic import Field
-from typing import Optional, List
+import json
+import platform
+from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
+from functools import cached_property
+from pydantic import Field, field_validator
+from typing import Annotated, Optional, List, FrozenSet
+
+def default_embedding_backend() -> str:
+    """OpenVINO on x86-64 Linux, where its int8 kernels are fastest; ONNX Runtime elsewhere."""
+    if platform.system() == "Linux" and platform.machine() in ("x86_64", "AMD64"):
+        return "openvino"
+    return "onnx"
 
 class Settings(BaseSettings):
     """
@@ -37,6 +45,10 @@ class Settings(BaseSettings):
     # Server settings
     host: str = "0.0.0.0"
     port: int = 8000
+    thread_pool_size: int = Field(
+        default=200,
+        description="Worker threads for sync endpoints and offloaded blocking calls"
+    )
 
     # File upload settings
     max_file_size_bytes: int = Field(
@@ -44,7 +56,8 @@ class Settings(BaseSettings):
         description="Maximum file size in bytes"
     )
 
-    allowed_file_types: List[str] = ["pdf", "txt", "docx"]
+    # NoDecode: env values reach the validator as raw strings (CSV or JSON)
+    allowed_file_types: Annotated[FrozenSet[str], NoDecode] = frozenset({"pdf", "txt", "docx"})
     upload_dir: str = "/app/uploads"
 
     # ChromaDB settings
@@ -54,8 +67,23 @@ class Settings(BaseSettings):
 
     # Embedding settings
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # "openvino" / "onnx" run the model's int8-quantized export;
+    # "torch" loads the original FP32 weights
+    embedding_backend: str = Field(default_factory=default_embedding_backend)
+    # None uses the backend's int8 export. Use "onnx/model_O2.onnx" (fused,
+    # FP32) where int8 drift isn't acceptable; O1-O4 exports are built if
+    # the model doesn't ship one
+    embedding_model_file: Optional[str] = None
+    embedding_export_dir: str = "/app/models"
+    # Token cap per text (None keeps the model's own, 256 for MiniLM);
+    # attention cost grows with the square of this
+    embedding_max_seq_length: Optional[int] = None
+    # sqlite file that keeps embeddings across restarts (None = memory only)
+    embedding_cache_path: Optional[str] = None
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    min_chunk_size: int = 200   # Smaller chunks are merged into a neighbour
+    max_chunk_size: int = 1200  # Merging never produces a chunk larger than this
 
     # LLM Model Selection
     llm_provider: str = "gemini"
@@ -68,19 +96,41 @@ class Settings(BaseSettings):
     claude_model: str = "claude-sonnet-4-20250514"
     claude_max_tokens: int = 8192
     
-    model_config = {
-        "env_file": ".env",
-        "env_file_encoding": "utf-8",
-        "case_sensitive": False,
-        "extra": "ignore"
-    }
-
-@lru_cache()  # Only create settings once, then reuse
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=False,
+        extra="ignore",
+        frozen=True  # Shared by every request, so never mutate it
+    )
+
+    @cached_property
+    def max_file_size_mb(self) -> float:
+        """Upload size limit in MB, computed once per Settings instance."""
+        return self.max_file_size_bytes / (1024 * 1024)
+
+    @field_validator("allowed_file_types", mode="before")
+    @classmethod
+    def parse_allowed_file_types(cls, v):
+        """
+        Accept a comma separated string (e.g. "pdf,txt"), a JSON list or any
+        iterable, and store lowercased extensions in a frozenset for O(1) lookups.
+        """
+        if isinstance(v, str):
+            v = json.loads(v) if v.lstrip().startswith("[") else v.split(",")
+        return frozenset(ext.strip().lower() for ext in v if ext.strip())
+
+# Created on first use, then reused for every request
+_settings: Optional[Settings] = None
+
 def get_settings() -> Settings:
     """
     Get application settings.
     """
-    return Settings()
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
 
 if __name__ == "__main__":
     settings = get_settings()
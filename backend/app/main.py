@@ -2,10 +2,14 @@
 Main FastAPI application.
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Query
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from anyio import to_thread
 import time
+import logging
 from pathlib import Path
 import traceback
 import sys
@@ -20,22 +24,75 @@ from app.models import (
     ErrorResponse,
     SystemStats,
     FileType,
+    FILE_TYPE_BY_EXTENSION,
     DocumentMetaData
 )
 from app.config import Settings, get_settings
-from app.services.document_services import DocumentService
+from app.services.document_services import DocumentService, FileTooLargeError
 from app.services.embedding_services import EmbeddingService
-from app.services.rag_services import RAGService
+from app.services.rag_services import RAGService, create_chroma_client
 from app.services.agent_service import StudyBuddyAgent
 
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks for the app."""
+    # Sync endpoints and blocking calls run in anyio's thread pool,
+    # which only has 40 threads by default
+    to_thread.current_default_thread_limiter().total_tokens = get_settings().thread_pool_size
+    
+    # Services are created once and shared by every request - the
+    # embedding model alone takes seconds and ~100MB to load
+    app.state.document_service = DocumentService()
+    app.state.embedding_service = EmbeddingService()
+    app.state.chroma_client = create_chroma_client()
+    app.state.rag_service = RAGService(
+        embedding_service=app.state.embedding_service,
+        chroma_client=app.state.chroma_client
+    )
+    
+    yield
+    
+    await app.state.embedding_service.aclose()
+
 # FastAPI App
 app = FastAPI(
     title="Study Buddy API",
     description="RAG based study assistant",
-    version="0.0.1"
+    version="0.0.1",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # orjson is much faster than stdlib json
 )
 
-# Allows frontend to call the api
+# Endpoints that accept file uploads, and the slack allowed on top of the
+# file size limit for multipart boundaries and part headers
+UPLOAD_PATHS = {"/upload", "/preview"}
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Reject uploads whose Content-Length is already over the limit.
+    
+    FastAPI parses the multipart body before the endpoint runs, so this
+    has to happen in middleware to avoid reading the body at all.
+    """
+    if request.method == "POST" and request.url.path in UPLOAD_PATHS:
+        settings = get_settings()
+        content_length = request.headers.get("content-length", "")
+        
+        if content_length.isdigit() and \
+                int(content_length) > settings.max_file_size_bytes + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File too large. Max size: {settings.max_file_size_mb}MB"}
+            )
+    
+    return await call_next(request)
+
+# Allows frontend to call the api (added last so it also wraps the
+# responses returned by the middleware above)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -44,17 +101,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# These functions create instances of our services
+# Used to count words without building a list of them
+WORD_RE = re.compile(r'\S+')
+
+# Uploads are read and written in 64KB pieces so memory use stays flat
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+async def iter_upload(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """Yield an uploaded file's bytes one chunk at a time."""
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+# These functions hand out the shared service instances created in lifespan
 # FastAPI will call them automatically when needed
 
-def get_document_service() -> DocumentService:
-    return DocumentService()
+def get_document_service(request: Request) -> DocumentService:
+    return request.app.state.document_service
 
-def get_embedding_service() -> EmbeddingService:
-    return EmbeddingService()
+def get_embedding_service(request: Request) -> EmbeddingService:
+    return request.app.state.embedding_service
 
-def get_rag_service() -> RAGService:
-    return RAGService()
+def get_rag_service(request: Request) -> RAGService:
+    return request.app.state.rag_service
 
 def get_agent_service(
     settings: Settings = Depends(get_settings),
@@ -63,7 +131,8 @@ def get_agent_service(
     """Get agent service instance."""
     return StudyBuddyAgent(
         claude_api_key=settings.claude_api_key,
-        rag_service=rag_service
+        rag_service=rag_service,
+        client=rag_service.client  # Share one pooled Anthropic client
     )
 
 # Route Handlers
@@ -80,32 +149,28 @@ async def upload_document(
         # Validate file
         file_extension = Path(file.filename).suffix[1:].lower()
         
-        if file_extension not in settings.allowed_file_types:
+        file_type = FILE_TYPE_BY_EXTENSION.get(file_extension)
+        
+        if file_type is None or file_extension not in settings.allowed_file_types:
             raise HTTPException(
                 status_code=400,
                 detail=f"File type not supported: {file_extension}"
             )
         
-        file_type = FileType(file_extension)
-        
-        # Read and validate size
-        content = await file.read()
-        file_size = len(content)
-        
-        if file_size > settings.max_file_size_bytes:
+        # Stream to disk, aborting as soon as the size limit is passed
+        try:
+            file_path, file_size, content_hash = await doc_service.save_file_stream(
+                file.filename,
+                iter_upload(file),
+                settings.max_file_size_bytes
+            )
+        except FileTooLargeError:
             raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Max size: {settings.max_file_size_bytes / (1024*1024)}MB"
+                status_code=413,
+                detail=f"File too large. Max size: {settings.max_file_size_mb}MB"
             )
-        
-        # Save file
-        file_path = await doc_service.save_file(file.filename, content)
         print(f"Saved file to: {file_path}")
         
-        # Extract text
-        text = doc_service.extract_text(file_path, file_type)
-        print(f"Extracted {len(text)} characters")
-        
         # Generate document ID
         document_id = str(uuid.uuid4())
         
@@ -117,12 +182,29 @@ async def upload_document(
             "upload_timestamp": datetime.now().isoformat()
         }
         
-        # Create chunks
-        chunks = doc_service.create_chunks(
-            text=text,
-            document_id=document_id,
-            metadata=metadata
-        )
+        # Extract text and create chunks
+        # Parsing and chunking are CPU bound - run them off the event loop
+        text = await run_in_threadpool(doc_service.get_cached_text, content_hash, file_type)
+        
+        if text is None and file_type == FileType.PDF:
+            # New PDFs are chunked page by page, without building the full text
+            chunks = await run_in_threadpool(
+                doc_service.create_pdf_chunks_streaming,
+                file_path, content_hash, document_id, metadata
+            )
+        else:
+            if text is None:
+                text = await run_in_threadpool(
+                    doc_service.extract_text_cached, file_path, file_type, content_hash
+                )
+            print(f"Extracted {len(text)} characters")
+            
+            chunks = await run_in_threadpool(
+                doc_service.create_chunks,
+                text=text,
+                document_id=document_id,
+                metadata=metadata
+            )
         
         print(f"Created {len(chunks)} chunks")
         
@@ -145,9 +227,10 @@ async def upload_document(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        print(f"Error uploading document: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(
+            "Error uploading document: %s", e,
+            extra={"error_type": type(e).__name__}
+        )
         raise HTTPException(
             status_code=500,
             detail=f"Error processing document: {str(e)}"
@@ -264,7 +347,7 @@ async def agent_query(
             detail=f"Agent error: {str(e)}"
         )
     
-@app.post("/preview", response_class=JSONResponse)
+@app.post("/preview")
 async def preview_document(
     file: UploadFile = File(...),
     doc_service: DocumentService = Depends(get_document_service),
@@ -275,29 +358,37 @@ async def preview_document(
         # Validate file type
         file_extension = Path(file.filename).suffix[1:].lower()
 
-        if file_extension not in settings.allowed_file_types:
+        file_type = FILE_TYPE_BY_EXTENSION.get(file_extension)
+        
+        if file_type is None or file_extension not in settings.allowed_file_types:
             raise HTTPException(
                 status_code=400,
                 detail=f"File type .{file_extension} not supported"
             )
-        
-        file_type = FileType(file_extension)
 
-        # Read file content
-        content = await file.read()
-        file_size = len(content)
-        
-        # Save file temporarily
-        file_path = await doc_service.save_file(file.filename, content)
+        # Stream file to disk temporarily
+        try:
+            file_path, file_size, content_hash = await doc_service.save_file_stream(
+                file.filename,
+                iter_upload(file),
+                settings.max_file_size_bytes
+            )
+        except FileTooLargeError:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Max size: {settings.max_file_size_mb}MB"
+            )
         
         print(f"Previewing file: {file.filename} ({file_size} bytes)")
         
         # Extract text
-        extracted_text = doc_service.extract_text(file_path, file_type)
+        extracted_text = await run_in_threadpool(
+            doc_service.extract_text_cached, file_path, file_type, content_hash
+        )
         
-        # Calculate stats
-        word_count = len(extracted_text.split())
-        line_count = len(extracted_text.split('\n'))
+        # Calculate stats (counting in C, without materialising split lists)
+        word_count = sum(1 for _ in WORD_RE.finditer(extracted_text))
+        line_count = extracted_text.count('\n') + 1
         
         # Create complete metadata for chunks
         chunk_metadata = {
@@ -308,7 +399,8 @@ async def preview_document(
         }
         
         # Create chunks for preview
-        chunks = doc_service.create_chunks(
+        chunks = await run_in_threadpool(
+            doc_service.create_chunks,
             text=extracted_text,
             document_id="preview",
             metadata=chunk_metadata              # ← Pass complete metadata
@@ -323,9 +415,7 @@ async def preview_document(
             "extracted_length": len(extracted_text),
             "word_count": word_count,
             "line_count": line_count,
-            "preview_first_500": extracted_text[:500],
-            "preview_last_500": extracted_text[-500:] if len(extracted_text) > 500 else "",
-            "full_text": extracted_text,
+            "content_hash": content_hash,  # Fetch the full text from /preview/text
             "chunk_count": len(chunks),
             "chunks": [
                 {
@@ -348,6 +438,8 @@ async def preview_document(
             }
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"Error previewing document: {str(e)}")
@@ -357,35 +449,58 @@ async def preview_document(
             detail=f"Error previewing document: {str(e)}"
         )
 
+
+# Size of each slice when streaming extracted text back to the client
+TEXT_STREAM_CHUNK_CHARS = 64 * 1024
+
+def iter_text_chunks(text: str, chunk_chars: int = TEXT_STREAM_CHUNK_CHARS):
+    """Yield a string as UTF-8 encoded slices."""
+    for start in range(0, len(text), chunk_chars):
+        yield text[start:start + chunk_chars].encode("utf-8")
+
+@app.get("/preview/text")
+def preview_text(
+    content_hash: str = Query(..., pattern=r"^[0-9a-f]{64}$"),
+    file_type: FileType = Query(...),
+    doc_service: DocumentService = Depends(get_document_service)
+):
+    """
+    Stream the full extracted text of a previewed document.
+    
+    /preview returns a content_hash instead of embedding the whole text
+    in its JSON body; the text is streamed from here as plain text.
+    """
+    text = doc_service.get_cached_text(content_hash, file_type)
     
+    if text is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Preview text not found. Please preview the document again."
+        )
+    
+    return StreamingResponse(
+        iter_text_chunks(text),
+        media_type="text/plain; charset=utf-8"
+    )
+
 @app.get("/health")
-async def health_check():
+def health_check():
     """Simple health check."""
     return {"status": "healthy"}
 
+# Plain def: Chroma's client is synchronous, so FastAPI runs this in the
+# thread pool instead of blocking the event loop
 @app.get("/stats")
-async def get_stats(
+def get_stats(
     rag_service: RAGService = Depends(get_rag_service)
 ):
     """Get system statistics."""
     try:
-        # Get collection info
-        collection = rag_service.collection
-        
         # Count total chunks
-        total_chunks = collection.count()
+        total_chunks = rag_service.collection.count()
         
-        # Get unique document IDs
-        if total_chunks > 0:
-            results = collection.get()
-            unique_docs = set()
-            if results and 'metadatas' in results:
-                for metadata in results['metadatas']:
-                    if metadata and 'document_id' in metadata:
-                        unique_docs.add(metadata['document_id'])
-            total_documents = len(unique_docs)
-        else:
-            total_documents = 0
+        # Count unique documents without pulling every chunk back
+        total_documents = rag_service.count_documents() if total_chunks > 0 else 0
         
         return {
             "total_documents": total_documents,
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Optional, List, Dict, Any, Union
+import numpy as np
 from datetime import datetime
 from enum import Enum
 
@@ -11,6 +12,9 @@ class FileType(str, Enum):
     TXT = "txt"
     DOCX = "docx"
 
+# Extension -> FileType, for an O(1) lookup on the upload path
+FILE_TYPE_BY_EXTENSION: Dict[str, FileType] = {f.value: f for f in FileType}
+
 class DocumentMetaData(BaseModel):
     """
     Metadata about an uploaded document.
@@ -82,14 +86,17 @@ class QueryResponse(BaseModel):
 
 class DocumentChunk(BaseModel):
     """A chunk of text from a document."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)  # For ndarray embeddings
+    
     chunk_id: str
     document_id: str
     text: str
-    chunk_index: int
-    start_char: Optional[int] = 0  # ← Make optional with default
-    end_char: Optional[int] = 0    # ← Make optional with default
+    chunk_index: int = Field(ge=0)
+    start_char: int = Field(default=0, ge=0)  # Offsets stay ints end to end
+    end_char: int = Field(default=0, ge=0)
     metadata: Dict[str, Any] = Field(default_factory=dict)  # ← Make flexible
-    embedding: Optional[list] = None
+    # float32 row from EmbeddingService.embed_chunks, or a plain list
+    embedding: Optional[Union[np.ndarray, list]] = None
 
 class ErrorResponse(BaseModel):
     """
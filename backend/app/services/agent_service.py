@@ -13,8 +13,9 @@ class StudyBuddyAgent:
     - Conversation management
     """
     
-    def __init__(self, claude_api_key: str, rag_service):
-        self.client = Anthropic(api_key=claude_api_key)
+    def __init__(self, claude_api_key: str, rag_service, client: Optional[Anthropic] = None):
+        # Reuse an existing client (and its HTTP connection pool) when given one
+        self.client = client or Anthropic(api_key=claude_api_key)
         self.rag_service = rag_service
         
         # Define agent tools
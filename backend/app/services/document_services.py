@@ -1,12 +1,21 @@
 """
 Service for handling document operations.
 """
+import os
 import uuid
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
 from pathlib import Path
 import re
-from typing import List
+import threading
+from collections import OrderedDict, deque
+from typing import List, AsyncIterator, Iterable, Iterator, Tuple, Optional
+import aiofiles
 from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from semantic_text_splitter import TextSplitter
 
 from app.models import (
     DocumentMetaData,
@@ -15,6 +24,85 @@ from app.models import (
 )
 from app.config import get_settings
 
+
+class FileTooLargeError(ValueError):
+    """Raised when an upload stream exceeds the configured size limit."""
+
+
+# Anything outside this set is replaced in saved upload filenames
+_SAFE_NAME_RE = re.compile(r'[^A-Za-z0-9._-]')
+
+# Text cache files are named after a sha256 hex digest and nothing else,
+# so a client-supplied hash can't point outside text_cache_dir
+_CONTENT_HASH_RE = re.compile(r'[0-9a-f]{64}')
+
+
+# Extracted text keyed by (content hash, file type), shared across
+# DocumentService instances so repeat uploads/previews skip parsing
+_TEXT_CACHE_SIZE = 32
+_text_cache: "OrderedDict[Tuple[str, FileType], str]" = OrderedDict()
+_text_cache_lock = threading.Lock()  # Extraction runs in worker threads
+
+
+def _remember_text(key: Tuple[str, FileType], text: str) -> None:
+    """Add extracted text to the in-memory LRU, evicting the oldest entry."""
+    with _text_cache_lock:
+        _text_cache[key] = text
+        _text_cache.move_to_end(key)
+        if len(_text_cache) > _TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+
+
+# PDFs with at least this many pages are split across worker processes,
+# PAGES_PER_TASK pages at a time; smaller files aren't worth the IPC
+_PARALLEL_PDF_MIN_PAGES = 64
+_PDF_PAGES_PER_TASK = 16
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Create the PDF worker pool on first use and reuse it afterwards."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn, not fork - extraction is called from server worker threads
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+
+def _pdf_page_text(page) -> str:
+    """
+    Extract the text of one PyMuPDF page.
+    
+    Pages that reference no fonts at all (scans, full-page plots and
+    diagrams) can't contain extractable text, so their content stream,
+    which for graphics-heavy pages can be megabytes of drawing operators,
+    is never parsed.
+    """
+    import fitz
+    
+    # Includes fonts used inside nested form XObjects
+    if not page.get_fonts():
+        return ""
+    return page.get_text("text", flags=fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_IMAGES)
+
+
+def _extract_pdf_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """
+    Extract text from pages [start, stop) of a PDF with PyMuPDF.
+    
+    Module level so it can be sent to worker processes.
+    """
+    import fitz
+    
+    with fitz.open(file_path) as pdf:
+        return [_pdf_page_text(pdf.load_page(i)) for i in range(start, stop)]
+
+
 class DocumentService:
     """
     A class groups related functions (methods) together.
@@ -22,10 +110,18 @@ class DocumentService:
     'self' refers to the instance of the class.
     Think of self as "this specific DocumentService object"
     """
+    # Chunk sizing used by create_chunks (800 works better than 1000 for dense content)
+    CHUNK_SIZE = 800
+    CHUNK_OVERLAP = 150
+    
     def __init__(self):
         self.settings = get_settings()
         self.upload_dir = Path(self.settings.upload_dir)
         self.upload_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Extracted text, keyed by content hash (see extract_text_cached)
+        self.text_cache_dir = self.upload_dir / ".cache"
+        self.text_cache_dir.mkdir(exist_ok=True)
 
         # Text splitter for chunking documents
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -33,28 +129,82 @@ class DocumentService:
             chunk_overlap = self.settings.chunk_overlap,
             length_function = len
         )
+        
+        # Native (Rust) splitter used by create_chunks
+        self.chunk_splitter = TextSplitter(
+            capacity=self.CHUNK_SIZE,
+            overlap=self.CHUNK_OVERLAP,
+            trim=True
+        )
 
     # Async functions
     async def save_file(self, filename: str, content: bytes) -> Path:
-                """
-                Save uploaded file to disk.
-                
-                Args:
-                    filename: Name of the file
-                    content: The file's bytes
-                    
-                Returns:
-                    Path: Where the file was saved
-                """
-                # Create unique filenames to avoid conflicts
-                file_id = uuid.uuid4().hex[:8]
-                safe_filename = f"{file_id}_{filename}"
-                file_path = self.upload_dir / safe_filename
-
-                with open(file_path, 'wb') as f:
-                        f.write(content)
-
-                        return file_path
+        """
+        Save an in-memory file to disk.
+        
+        Uploads should use save_file_stream so the file is never fully
+        buffered; this wraps it for callers that already hold the bytes.
+        
+        Args:
+            filename: Name of the file
+            content: The file's bytes
+            
+        Returns:
+            Path: Where the file was saved
+        """
+        async def single_chunk():
+            yield content
+
+        file_path, _, _ = await self.save_file_stream(
+            filename, single_chunk(), max_size_bytes=len(content)
+        )
+        return file_path
+
+    async def save_file_stream(
+        self,
+        filename: str,
+        chunks: AsyncIterator[bytes],
+        max_size_bytes: int
+    ) -> Tuple[Path, int, str]:
+        """
+        Stream an upload to disk chunk by chunk.
+
+        Only one chunk is held in memory at a time, and the write is
+        aborted as soon as the running size passes max_size_bytes.
+
+        Args:
+            filename: Name of the file
+            chunks: Async iterator yielding the file's bytes
+            max_size_bytes: Maximum allowed size of the file
+
+        Returns:
+            Tuple of (saved path, size in bytes, sha256 hex digest)
+
+        Raises:
+            FileTooLargeError: If the stream exceeds max_size_bytes
+        """
+        # 8 hex chars straight from 4 random bytes; the name is reduced to
+        # its last path component and safe characters (no "../" tricks)
+        file_id = uuid.uuid4().bytes[:4].hex()
+        file_path = self.upload_dir / f"{file_id}_{_SAFE_NAME_RE.sub('_', Path(filename).name)}"
+
+        file_size = 0
+        digest = hashlib.sha256()
+
+        try:
+            async with aiofiles.open(file_path, 'wb') as f:
+                async for chunk in chunks:
+                    file_size += len(chunk)
+                    if file_size > max_size_bytes:
+                        raise FileTooLargeError(file_size)
+                    digest.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            # Don't leave partial uploads lying around
+            file_path.unlink(missing_ok=True)
+            raise
+
+        return file_path, file_size, digest.hexdigest()
     
     def extract_text(self, file_path: Path, file_type: FileType) -> str:
         """
@@ -81,6 +231,85 @@ class DocumentService:
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
 
+    def extract_text_cached(
+        self,
+        file_path: Path,
+        file_type: FileType,
+        content_hash: str
+    ) -> str:
+        """
+        Extract text, reusing the result for files with the same content.
+        
+        Checks the in-memory LRU first, then the on-disk cache in
+        upload_dir/.cache, so re-uploads skip parsing even after a restart.
+        
+        Args:
+            file_path: Path to the file
+            file_type: Type of file (PDF, TXT, DOCX)
+            content_hash: Hash of the file's bytes (from save_file_stream)
+            
+        Returns:
+            str: Extracted text
+        """
+        text = self.get_cached_text(content_hash, file_type)
+        if text is not None:
+            print("Using cached extracted text")
+            return text
+        
+        text = self.extract_text(file_path, file_type)
+        
+        # Write to a temp file and rename, so a concurrent reader never
+        # sees a half-written cache entry
+        cache_path = self._text_cache_path(content_hash, file_type)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, cache_path)
+        
+        _remember_text((content_hash, file_type), text)
+        return text
+
+    def get_cached_text(self, content_hash: str, file_type: FileType) -> Optional[str]:
+        """
+        Look up previously extracted text without extracting again.
+        
+        Returns:
+            The cached text, or None if it was never extracted
+        """
+        key = (content_hash, file_type)
+        
+        with _text_cache_lock:
+            if key in _text_cache:
+                _text_cache.move_to_end(key)
+                return _text_cache[key]
+        
+        cache_path = self._text_cache_path(content_hash, file_type)
+        if not cache_path.exists():
+            return None
+        
+        text = cache_path.read_text(encoding="utf-8")
+        _remember_text(key, text)
+        return text
+
+    def _text_cache_path(self, content_hash: str, file_type: FileType) -> Path:
+        """Where the extracted text for a given file content is stored on disk."""
+        if not _CONTENT_HASH_RE.fullmatch(content_hash):
+            raise ValueError(f"Invalid content hash: {content_hash!r}")
+        return self.text_cache_dir / f"{content_hash}.{file_type.value}.txt"
+
+    # Text cleaning tables, built once rather than on every call
+    _CHAR_FIXES = str.maketrans({
+        '\u2018': "'",   # Left single quote
+        '\u2019': "'",   # Right single quote
+        '\u201c': '"',   # Left double quote
+        '\u201d': '"',   # Right double quote
+        '\u2014': '-',   # Em dash
+        '\u2013': '-',   # En dash
+        '\u2026': '...', # Ellipsis
+    })
+    _LINE_EDGE_WS_RE = re.compile(r'[^\S\n]*\n[^\S\n]*')
+    _EXTRA_NEWLINES_RE = re.compile(r'\n{4,}')
+    _MULTI_SPACE_RE = re.compile(r' {2,}')
+
     def _clean_text(self, text: str) -> str:
         """
         Minimal text cleaning - only fixes obvious OCR errors.
@@ -91,29 +320,17 @@ class DocumentService:
         Returns:
             str: Lightly cleaned text
         """
-        # Fix smart quotes and dashes
-        replacements = {
-            ''': "'",
-            ''': "'",
-            '"': '"',
-            '"': '"',
-            '—': '-',
-            '–': '-',
-            '…': '...',
-        }
-        
-        for old, new in replacements.items():
-            text = text.replace(old, new)
+        # Fix smart quotes and dashes in a single pass
+        text = text.translate(self._CHAR_FIXES)
         
-        # Replace multiple spaces with single space (but preserve newlines)
-        text = re.sub(r' +', ' ', text)
+        # Remove trailing/leading whitespace from each line
+        text = self._LINE_EDGE_WS_RE.sub('\n', text)
         
-        # Replace more than 3 newlines with 2 newlines
-        text = re.sub(r'\n{4,}', '\n\n\n', text)
+        # Replace more than 3 newlines with 3 newlines
+        text = self._EXTRA_NEWLINES_RE.sub('\n\n\n', text)
         
-        # Remove trailing/leading whitespace from each line
-        lines = [line.strip() for line in text.split('\n')]
-        text = '\n'.join(lines)
+        # Replace multiple spaces with single space (but preserve newlines)
+        text = self._MULTI_SPACE_RE.sub(' ', text)
         
         return text.strip()
 
@@ -122,10 +339,8 @@ class DocumentService:
         Extract text from PDF - optimized for large files.
         
         Tries:
-        1. pdfplumber (best for digital PDFs)
-        2. pypdf (fallback)
-        
-        Returns the cleanest result.
+        1. PyMuPDF (C core, fast and good quality)
+        2. pypdf (fallback, only if PyMuPDF finds no text)
         """
         import time
         start_time = time.time()
@@ -133,73 +348,65 @@ class DocumentService:
         file_size_mb = file_path.stat().st_size / (1024 * 1024)
         print(f"PDF size: {file_size_mb:.1f}MB")
         
-        results = []
+        text = ""
         
-        # Method 1: pdfplumber (slower but better quality)
+        # Method 1: PyMuPDF (much faster than the pure-Python parsers)
         try:
-            import pdfplumber
-            print("Using pdfplumber for PDF extraction")
+            import fitz
+            print("Using PyMuPDF for PDF extraction")
             
-            text_parts = []
-            with pdfplumber.open(file_path) as pdf:
-                total_pages = len(pdf.pages)
-                print(f"Processing {total_pages} pages...")
+            with fitz.open(file_path) as pdf:
+                total_pages = pdf.page_count
+            print(f"Processing {total_pages} pages...")
+            
+            if total_pages >= _PARALLEL_PDF_MIN_PAGES and (os.cpu_count() or 1) > 1:
+                # Pages are independent, so spread them over all cores
+                starts = list(range(0, total_pages, _PDF_PAGES_PER_TASK))
+                stops = [min(start + _PDF_PAGES_PER_TASK, total_pages) for start in starts]
                 
-                for i, page in enumerate(pdf.pages, 1):
-                    # Progress indicator for large files
-                    if i % 50 == 0 or i == total_pages:
-                        elapsed = time.time() - start_time
-                        print(f"  Page {i}/{total_pages} ({elapsed:.1f}s elapsed)")
-                    
-                    text = page.extract_text()
-                    if text:
-                        text_parts.append(text)
+                page_texts = [
+                    page_text
+                    for batch in _get_pdf_pool().map(
+                        _extract_pdf_page_range, repeat(str(file_path)), starts, stops
+                    )
+                    for page_text in batch
+                ]
+            else:
+                page_texts = _extract_pdf_page_range(str(file_path), 0, total_pages)
             
-            text = "\n\n".join(text_parts)
+            print(f"  {total_pages} pages done ({time.time() - start_time:.1f}s elapsed)")
             
-            if text:
-                cleaned = self._clean_text(text)
-                results.append(('pdfplumber', cleaned))
-                print(f"✓ Extracted {len(cleaned):,} characters in {time.time() - start_time:.1f}s")
+            # Drop empty pages in one C-level pass
+            text = "\n\n".join(filter(None, page_texts))
         
         except Exception as e:
-            print(f"⚠️ pdfplumber failed: {e}")
+            print(f"⚠️ PyMuPDF failed: {e}")
         
-        # Method 2: pypdf (faster, lower quality)
-        if not results:
+        # Method 2: pypdf (only when PyMuPDF came back empty)
+        if not text.strip():
             try:
-                from pypdf import PdfReader
                 print("Trying pypdf as fallback...")
                 
                 reader = PdfReader(file_path)
                 total_pages = len(reader.pages)
                 print(f"Processing {total_pages} pages...")
                 
-                text_parts = []
-                for i, page in enumerate(reader.pages, 1):
-                    if i % 50 == 0 or i == total_pages:
-                        print(f"  Page {i}/{total_pages}")
-                    
-                    text = page.extract_text()
-                    if text:
-                        text_parts.append(text)
-                
-                text = "\n\n".join(text_parts)
-                
-                if text:
-                    cleaned = self._clean_text(text)
-                    results.append(('pypdf', cleaned))
-                    print(f"Extracted {len(cleaned):,} characters in {time.time() - start_time:.1f}s")
+                # extract_text() runs exactly once per page; empty pages are
+                # filtered out as the join consumes the generator
+                text = "\n\n".join(
+                    filter(None, (page.extract_text() for page in reader.pages))
+                )
+                print(f"  {total_pages} pages done")
             
             except Exception as e:
                 print(f"pypdf failed: {e}")
         
-        # Return best result
-        if results:
-            best = max(results, key=lambda x: len(x[1]))
-            return best[1]
-        else:
+        if not text.strip():
             raise ValueError("Could not extract text from PDF with any method")
+        
+        cleaned = self._clean_text(text)
+        print(f"✓ Extracted {len(cleaned):,} characters in {time.time() - start_time:.1f}s")
+        return cleaned
 
     def _extract_txt(self, file_path: Path) -> str:
         """Extract text from TXT file."""
@@ -220,21 +427,21 @@ class DocumentService:
         """Extract text from DOCX file."""
         try:
             import docx
+            from docx.text.paragraph import Paragraph
             doc = docx.Document(file_path)
             
-            text_parts = []
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text_parts.append(paragraph.text)
-            
-            # Also extract from tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        if cell.text.strip():
-                            text_parts.append(cell.text)
+            def iter_block_text():
+                # One pass over the body in document order, so table text
+                # lands where the table is rather than after every paragraph
+                for block in doc.iter_inner_content():
+                    if isinstance(block, Paragraph):
+                        yield block.text
+                    else:
+                        for row in block.rows:
+                            for cell in row.cells:
+                                yield cell.text
             
-            text = "\n\n".join(text_parts)
+            text = "\n\n".join(part for part in iter_block_text() if part.strip())
             print(f"Extracted {len(text):,} characters from DOCX")
             
             return self._clean_text(text)
@@ -242,6 +449,45 @@ class DocumentService:
         except Exception as e:
             raise ValueError(f"Could not extract text from DOCX: {str(e)}")
         
+    def _merge_small_chunks(
+        self,
+        raw_chunks: List[Tuple[int, str]]
+    ) -> List[Tuple[int, int]]:
+        """
+        Fold undersized chunks into their neighbour in a single pass.
+        
+        The splitter never returns a chunk over CHUNK_SIZE, but it does
+        leave short fragments (page footers, headings, the tail of a
+        document) that embed poorly. A chunk shorter than min_chunk_size
+        is merged with the one before it, as long as the merged span
+        stays within max_chunk_size.
+        
+        Args:
+            raw_chunks: (start offset, trimmed text) pairs from the splitter
+            
+        Returns:
+            List of (start_char, end_char) spans into the source text
+        """
+        min_size = self.settings.min_chunk_size
+        max_size = self.settings.max_chunk_size
+        
+        spans: List[Tuple[int, int]] = []
+        for start, chunk_text in raw_chunks:
+            if not chunk_text:
+                continue
+            end = start + len(chunk_text)
+            
+            if spans:
+                prev_start, prev_end = spans[-1]
+                too_small = len(chunk_text) < min_size or prev_end - prev_start < min_size
+                if too_small and end - prev_start <= max_size:
+                    spans[-1] = (prev_start, end)
+                    continue
+            
+            spans.append((start, end))
+        
+        return spans
+
     def create_chunks(
         self,
         text: str,
@@ -253,69 +499,220 @@ class DocumentService:
         
         Optimizations:
         - 800 char chunks (better than 1000 for dense content)
-        - Comprehensive separator list (preserves sentences)
+        - Tiny fragments merged into their neighbours
+        - Native splitter that breaks on paragraphs, then sentences, then words
         - Position tracking (for debugging/analysis)
         """
         
-        # Configure splitter
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,
-            chunk_overlap=150,
-            length_function=len,
-            separators=[
-                "\n\n\n",  # Major breaks (3+ newlines)
-                "\n\n",    # Paragraph breaks
-                "\n",      # Line breaks
-                ". ",      # Sentence ends (period + space)
-                "! ",      # Exclamations
-                "? ",      # Questions
-                "; ",      # Semicolons
-                ": ",      # Colons
-                ", ",      # Commas
-                " ",       # Spaces
-                "",        # Characters (last resort)
-            ],
-            is_separator_regex=False,
+        # Split text - offsets come back with the chunks, so no searching
+        # the source text to find where each one starts
+        spans = self._merge_small_chunks(self.chunk_splitter.chunk_indices(text))
+        
+        # Create chunks with metadata
+        chunks = self._build_chunks(
+            text, spans, document_id, {**metadata, "total_chunks": len(spans)}
         )
         
-        # Split text
-        raw_chunks = text_splitter.split_text(text)
+        if chunks:
+            print(f"Created {len(chunks)} chunks (avg {sum(len(c.text) for c in chunks) / len(chunks):.0f} chars)")
+        return chunks
+
+    def create_chunks_streaming(
+        self,
+        pages: Iterable[str],
+        document_id: str,
+        metadata: dict
+    ) -> Iterator[DocumentChunk]:
+        """
+        Chunk text that arrives a page at a time, without joining it first.
         
-        # Create chunks with metadata
-        chunks = []
-        current_pos = 0
+        Only a rolling buffer of recent text is kept. Once the buffer holds
+        at least 2x CHUNK_SIZE, chunks that end before its last CHUNK_SIZE
+        characters can no longer change and are yielded; the buffer is cut
+        back to the first chunk still pending. Offsets are relative to the
+        pages joined with blank lines, as create_chunks would see them.
+        
+        Args:
+            pages: Cleaned page texts, in order
+            document_id: ID of the document being chunked
+            metadata: Metadata copied onto every chunk
+            
+        Yields:
+            DocumentChunk objects in order (without total_chunks, which
+            isn't known until the last page)
+        """
+        buffer = ""
+        base = 0  # Offset of buffer[0] in the whole document
+        chunk_index = 0
         
-        for i, chunk_text in enumerate(raw_chunks):
-            # Clean whitespace
-            cleaned = chunk_text.strip()
-            if not cleaned:
+        for page_text in pages:
+            buffer = f"{buffer}\n\n{page_text}" if buffer or base else page_text
+            if len(buffer) < 2 * self.CHUNK_SIZE:
                 continue
             
-            # Track position in original text
-            start_char = text.find(chunk_text, current_pos)
-            if start_char == -1:
-                start_char = current_pos
-            end_char = start_char + len(chunk_text)
+            spans = self._merge_small_chunks(self.chunk_splitter.chunk_indices(buffer))
+            settle_before = len(buffer) - self.CHUNK_SIZE
             
-            # Create chunk
-            chunk = DocumentChunk(
-                chunk_id=str(uuid.uuid4()),
+            settled = 0
+            while settled < len(spans) and spans[settled][1] <= settle_before:
+                settled += 1
+            
+            if settled:
+                yield from self._build_chunks(
+                    buffer, spans[:settled], document_id, metadata, chunk_index, base
+                )
+                chunk_index += settled
+                
+                keep_from = spans[settled][0] if settled < len(spans) else spans[-1][1]
+                buffer = buffer[keep_from:]
+                base += keep_from
+        
+        # Whatever is left once the pages run out
+        spans = self._merge_small_chunks(self.chunk_splitter.chunk_indices(buffer))
+        yield from self._build_chunks(buffer, spans, document_id, metadata, chunk_index, base)
+
+    def iter_pdf_pages(self, file_path: Path) -> Iterator[str]:
+        """
+        Yield the cleaned text of each non-empty PDF page, in page order.
+        
+        Large PDFs are extracted by the PDF worker pool like _extract_pdf,
+        with only a bounded number of page ranges in flight, so pages are
+        parsed in parallel without the whole text piling up in memory.
+        """
+        for raw_text in self._iter_raw_pdf_pages(file_path):
+            page_text = self._clean_text(raw_text)
+            if page_text:
+                yield page_text
+
+    def _iter_raw_pdf_pages(self, file_path: Path) -> Iterator[str]:
+        """Yield the raw PyMuPDF text of every page, in page order."""
+        import fitz
+        
+        with fitz.open(file_path) as pdf:
+            total_pages = pdf.page_count
+        
+        workers = os.cpu_count() or 1
+        if total_pages < _PARALLEL_PDF_MIN_PAGES or workers == 1:
+            yield from _extract_pdf_page_range(str(file_path), 0, total_pages)
+            return
+        
+        pool = _get_pdf_pool()
+        ranges = (
+            (start, min(start + _PDF_PAGES_PER_TASK, total_pages))
+            for start in range(0, total_pages, _PDF_PAGES_PER_TASK)
+        )
+        
+        # Two ranges per worker keeps every core busy while the chunker
+        # consumes results
+        pending = deque(
+            pool.submit(_extract_pdf_page_range, str(file_path), start, stop)
+            for start, stop in islice(ranges, 2 * workers)
+        )
+        while pending:
+            batch = pending.popleft().result()
+            for start, stop in islice(ranges, 1):
+                pending.append(pool.submit(_extract_pdf_page_range, str(file_path), start, stop))
+            yield from batch
+
+    def create_pdf_chunks_streaming(
+        self,
+        file_path: Path,
+        content_hash: str,
+        document_id: str,
+        metadata: dict
+    ) -> List[DocumentChunk]:
+        """
+        Chunk a PDF page by page, never holding its full text in memory.
+        
+        Pages are also written to the on-disk text cache as they go past,
+        so later previews/re-uploads of the same file still hit the cache.
+        Falls back to extract_text_cached + create_chunks when PyMuPDF
+        can't read the file or finds no text (e.g. scanned PDFs).
+        
+        Args:
+            file_path: Path to the PDF
+            content_hash: Hash of the file's bytes (from save_file_stream)
+            document_id: ID of the document being chunked
+            metadata: Metadata copied onto every chunk
+            
+        Returns:
+            List of DocumentChunk objects
+        """
+        cache_path = self._text_cache_path(content_hash, FileType.PDF)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        
+        def pages_to_cache(cache_file) -> Iterator[str]:
+            for i, page_text in enumerate(self.iter_pdf_pages(file_path)):
+                cache_file.write(f"\n\n{page_text}" if i else page_text)
+                yield page_text
+        
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as cache_file:
+                chunks = list(self.create_chunks_streaming(
+                    pages_to_cache(cache_file), document_id, metadata
+                ))
+        except Exception as e:
+            print(f"⚠️ Streaming PDF extraction failed: {e}")
+            chunks = []
+        
+        if not chunks:
+            tmp_path.unlink(missing_ok=True)
+            text = self.extract_text_cached(file_path, FileType.PDF, content_hash)
+            return self.create_chunks(text, document_id, metadata)
+        
+        os.replace(tmp_path, cache_path)
+        for chunk in chunks:
+            chunk.metadata["total_chunks"] = len(chunks)
+        
+        print(f"Created {len(chunks)} chunks from streamed pages")
+        return chunks
+
+    def _build_chunks(
+        self,
+        text: str,
+        spans: List[Tuple[int, int]],
+        document_id: str,
+        metadata: dict,
+        first_index: int = 0,
+        offset: int = 0
+    ) -> List[DocumentChunk]:
+        """
+        Create DocumentChunks for a run of spans in one tight loop.
+        
+        Everything shared by the chunks (id prefix, base metadata, bound
+        methods) is set up once, so the loop body is just slicing and one
+        unvalidated model construction per chunk.
+        
+        Args:
+            text: Text the spans index into
+            spans: (start, end) offsets into text
+            document_id: ID of the document being chunked
+            metadata: Metadata copied onto every chunk
+            first_index: chunk_index of the first span
+            offset: Position of text[0] in the whole document
+            
+        Returns:
+            List of DocumentChunk objects
+        """
+        id_prefix = f"{document_id}_chunk_"
+        chunks = []
+        append = chunks.append
+        # Every field here comes from the splitter's own offsets, so skip
+        # pydantic validation; API input models still validate
+        construct = DocumentChunk.model_construct
+        
+        for chunk_index, (start, end) in enumerate(spans, first_index):
+            append(construct(
+                chunk_id=f"{id_prefix}{chunk_index}",
                 document_id=document_id,
-                text=cleaned,
-                chunk_index=len(chunks),  # Use actual index (skipping empty chunks)
-                start_char=start_char,
-                end_char=end_char,
-                metadata={
-                    **metadata,
-                    "chunk_index": len(chunks),
-                    "total_chunks": len(raw_chunks),
-                    "chunk_size": len(cleaned),
-                }
-            )
-            chunks.append(chunk)
-            current_pos = end_char
+                text=text[start:end],
+                chunk_index=chunk_index,
+                start_char=offset + start,
+                end_char=offset + end,
+                metadata={**metadata, "chunk_index": chunk_index, "chunk_size": end - start},
+                embedding=None
+            ))
         
-        print(f"Created {len(chunks)} chunks (avg {sum(len(c.text) for c in chunks) / len(chunks):.0f} chars)")
         return chunks
 
 if __name__ == "__main__":
@@ -3,38 +3,275 @@ Service for generating embeddings from text.
 Embeddings are numerical representations that capture semantic meaning.
 """
 
-from typing import List
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import torch
 from sentence_transformers import SentenceTransformer
+from sentence_transformers.util import batch_to_device
+from starlette.concurrency import run_in_threadpool
 import numpy as np
 
 from app.models import DocumentChunk
 from app.config import get_settings
 
+# Model file used for each exported backend unless one is configured
+DEFAULT_MODEL_FILES = {
+    "onnx": "onnx/model_qint8_avx512_vnni.onnx",
+    "openvino": "openvino/openvino_model_qint8_quantized.xml",
+}
+
+# Optimum graph-optimized ONNX exports, e.g. "onnx/model_O2.onnx"
+OPTIMIZED_ONNX_FILE_RE = re.compile(r"^onnx/model_(O[1-4])\.onnx$")
+
 class EmbeddingService:
     """
     Handles text embedding generation.
     
     Uses sentence-transformers library which runs locally.
     """
-    def __init__(self):
+    # embed_chunks / embed_query requests are pooled and encoded together:
+    # the worker waits up to BATCH_WAIT_SECONDS for more requests, or until
+    # it has MAX_BATCH_REQUESTS requests or MAX_BATCH_TEXTS texts, then runs
+    # one encode call for all of them
+    MAX_BATCH_TEXTS = 512
+    MAX_BATCH_REQUESTS = 32
+    BATCH_WAIT_SECONDS = 0.01
+    
+    # Texts per forward pass; GPUs need much bigger batches to stay busy
+    CPU_BATCH_SIZE = 32
+    GPU_BATCH_SIZE = 256
+    
+    # Number of recent embed_text results kept (1.5KB each as float32)
+    EMBED_TEXT_CACHE_SIZE = 4096
+    CACHE_DB_BATCH = 500  # Keys per SELECT ... IN (...) on the disk cache
+    
+    def __init__(self, threads: Optional[int] = None):
         """
         Initialize the embedding model.
         
         This downloads the model on first run (~100MB).
         Subsequent runs load it from cache.
+        
+        Args:
+            threads: CPU threads used inside one encode call (default: every
+                core this process may run on)
         """
         self.settings = get_settings()
+        
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.batch_size = self.GPU_BATCH_SIZE if self.device == "cuda" else self.CPU_BATCH_SIZE
+        
+        self.threads = threads or self._available_cpus()
+        self._configure_torch_threads()
 
-        # Load the model
-        self.model = SentenceTransformer(self.settings.embedding_model)
+        # Load the model (_load_exported_model records which export file)
+        self.model_file: Optional[str] = None
+        self.model = self._load_model()
+
+        # encode() already sorts texts by length and pads each batch only to
+        # its longest text; this caps how long that can be
+        if self.settings.embedding_max_seq_length:
+            self.model.max_seq_length = self.settings.embedding_max_seq_length
+
+        # Dropout off for good - _encode_text calls the modules directly, and
+        # only encode() switches to eval mode by itself
+        self.model.eval()
+
+        # Tokenizer for the single-text path (older sentence-transformers
+        # only have tokenize())
+        self._preprocess = getattr(self.model, "preprocess", None) or self.model.tokenize
 
         # Get embedding dimension
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
 
         print(f"Model loaded. Embedding dimension: {self.embedding_dim}")
+        
+        # Per-instance LRU, so it's tied to this model and freed with it;
+        # shared by embed_text and embed_query
+        self._embed_text_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        
+        # Optional on-disk tier behind the LRU, so restarts don't re-embed
+        self._cache_db: Optional[sqlite3.Connection] = None
+        self._cache_db_lock = threading.Lock()
+        # Rows are per model configuration - the export file (int8 vs FP32),
+        # FP16 on GPU and the truncation length all change the vectors
+        self._cache_db_model = "|".join([
+            self.settings.embedding_model,
+            getattr(self.model, "backend", "torch"),
+            self.model_file or "pytorch",
+            "cuda-float16" if self.device == "cuda" else "cpu-float32",
+            f"max_seq_length={self.model.max_seq_length}",
+        ])
+        if self.settings.embedding_cache_path:
+            self._cache_db = self._open_cache_db(self.settings.embedding_cache_path)
+        
+        # Batching queue for embed_chunks, bound to the running event loop
+        # on first use (see _get_queue)
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _available_cpus() -> int:
+        """Cores this process may use (respects container/taskset CPU limits)."""
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    def _configure_torch_threads(self) -> None:
+        """
+        Size PyTorch's thread pools for batched encoding.
+        
+        All threads go to intra-op parallelism (splitting each matmul);
+        the model runs one op at a time, so inter-op threads mostly idle.
+        """
+        torch.set_num_threads(self.threads)
+        try:
+            torch.set_num_interop_threads(2)
+        except RuntimeError:
+            # Can only be set once per process, before any parallel work
+            pass
+
+    def _load_model(self) -> SentenceTransformer:
+        """
+        Load the embedding model with the configured backend.
+        
+        On a CUDA GPU the model runs as FP16 PyTorch. On CPU the int8
+        OpenVINO/ONNX exports are ~4x smaller than the FP32 weights and run
+        2-4x faster (VNNI int8 dot products). OpenVINO falls back to ONNX
+        Runtime, and either falls back to PyTorch if its runtime isn't
+        installed or the export can't be loaded.
+        """
+        backend = self.settings.embedding_backend
+        
+        if self.device == "cuda":
+            # The int8 export only helps on CPU - on a GPU run the PyTorch
+            # weights in FP16, which halves VRAM and uses the tensor cores
+            model = SentenceTransformer(self.settings.embedding_model, device="cuda")
+            model.half()
+            print("Loaded FP16 model on GPU")
+            return model
+        
+        if backend != "torch":
+            # An explicit model file only applies to the configured backend
+            candidates = [(backend, self.settings.embedding_model_file or DEFAULT_MODEL_FILES.get(backend))]
+            if backend == "openvino":
+                candidates.append(("onnx", DEFAULT_MODEL_FILES["onnx"]))
+            
+            for candidate, file_name in candidates:
+                try:
+                    return self._load_exported_model(candidate, file_name)
+                except Exception as e:
+                    print(f"⚠️ Could not load {candidate} model ({e})")
+            print("⚠️ Falling back to PyTorch")
+        
+        return SentenceTransformer(self.settings.embedding_model)
+
+    def _load_exported_model(self, backend: str, file_name: str) -> SentenceTransformer:
+        """
+        Load an exported (ONNX or OpenVINO) model file.
+        
+        Args:
+            backend: "onnx" or "openvino"
+            file_name: Model file inside the model repo
+            
+        Returns:
+            SentenceTransformer: The loaded model
+        """
+        try:
+            model = SentenceTransformer(
+                self.settings.embedding_model,
+                backend=backend,
+                model_kwargs=self._backend_model_kwargs(backend, file_name)
+            )
+        except Exception:
+            # Models that don't publish an optimized export get one built
+            optimized = OPTIMIZED_ONNX_FILE_RE.match(file_name)
+            if backend != "onnx" or not optimized:
+                raise
+            model = self._export_optimized_onnx(optimized.group(1), file_name)
+            self.model_file = file_name
+            return model
+        
+        print(f"Loaded {backend} model: {file_name}")
+        self.model_file = file_name
+        return model
+
+    def _backend_model_kwargs(self, backend: str, file_name: str) -> dict:
+        """
+        model_kwargs for loading an exported (non-PyTorch) model on CPU.
+        
+        The provider is pinned so ONNX Runtime doesn't probe for GPU
+        providers - GPUs are handled by the PyTorch FP16 path instead.
+        """
+        model_kwargs = {"file_name": file_name}
+        if backend == "onnx":
+            model_kwargs["provider"] = "CPUExecutionProvider"
+            model_kwargs["session_options"] = self._ort_session_options()
+        elif backend == "openvino":
+            model_kwargs["ov_config"] = {"INFERENCE_NUM_THREADS": str(self.threads)}
+        return model_kwargs
+
+    def _ort_session_options(self):
+        """ONNX Runtime session options for the embedding model."""
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        # Constant folding plus the transformer fusions (attention,
+        # LayerNorm, GELU) for any graph that isn't already optimized
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # The encoder graph is a chain of ops, so threads go to intra-op
+        # work; the default sequential execution mode is kept
+        options.intra_op_num_threads = self.threads
+        return options
+
+    def _export_optimized_onnx(self, level: str, file_name: str) -> SentenceTransformer:
+        """
+        Build and load an O1-O4 optimized ONNX export of the embedding model.
+        
+        Only needed for models that don't publish one (all-MiniLM-L6-v2
+        ships its exports). The export is written to embedding_export_dir
+        once and loaded from there on later starts.
+        
+        Args:
+            level: Optimum optimization level, "O1" to "O4"
+            file_name: Where the export lands, e.g. "onnx/model_O2.onnx"
+            
+        Returns:
+            SentenceTransformer: The optimized model
+        """
+        from sentence_transformers import export_optimized_onnx_model
+        
+        export_dir = Path(self.settings.embedding_export_dir) / self.settings.embedding_model.replace("/", "__")
+        
+        if not (export_dir / file_name).exists():
+            print(f"Exporting {level}-optimized ONNX model to {export_dir}...")
+            base_model = SentenceTransformer(
+                self.settings.embedding_model,
+                backend="onnx",
+                model_kwargs={"provider": "CPUExecutionProvider"}
+            )
+            # Full model dir (tokenizer, pooling config) next to the export
+            base_model.save(str(export_dir))
+            export_optimized_onnx_model(base_model, level, str(export_dir))
+        
+        model = SentenceTransformer(
+            str(export_dir),
+            backend="onnx",
+            model_kwargs=self._backend_model_kwargs("onnx", file_name)
+        )
+        print(f"Loaded onnx model: {export_dir / file_name}")
+        return model
 
     # Embedding a single text
-    def embed_text(self, text: str) -> List[float]:
+    def embed_text(self, text: str) -> np.ndarray:
         """
         Convert a single text string into an embedding vector.
         
@@ -42,27 +279,137 @@ class EmbeddingService:
             text: The text to embed
             
         Returns:
-            List[float]: A vector of numbers representing the text
+            np.ndarray: A float32 vector of numbers representing the text
             
         Example:
             >>> service = EmbeddingService()
             >>> vector = service.embed_text("What is photosynthesis?")
-            >>> len(vector)
-            384
+            >>> vector.shape
+            (384,)
             >>> vector[:3]
-            [0.234, -0.123, 0.567]
+            array([ 0.234, -0.123,  0.567], dtype=float32)
+        """
+        # Repeated questions (chat retries, follow-ups) skip the model
+        key = self._cache_key(text)
+        embedding = self._embed_text_cache.get(key)
+        if embedding is not None:
+            self._embed_text_cache.move_to_end(key)
+            return embedding.copy()
+        
+        embedding = self._load_from_disk([key]).get(key)
+        if embedding is not None:
+            self._remember_embedding(key, embedding)
+            return embedding.copy()
+        
+        embedding = self._encode_text(text)
+        self._remember_embedding(key, embedding)
+        self._save_to_disk([(key, embedding)])
+        return embedding.copy()
+
+    def _encode_text(self, text: str) -> np.ndarray:
+        """
+        Run the model on one text; cached by embed_text.
+        
+        encode() length-sorts, batches and unpacks its inputs, which is
+        pure overhead for a single string, so this tokenizes and runs the
+        model's modules (transformer, pooling, normalize) directly.
+        """
+        if self.model.default_prompt_name:
+            # Only encode() knows to prepend the default prompt
+            embedding = self.model.encode(
+                text,
+                convert_to_numpy=True,
+                normalize_embeddings=True # for better similarity search
+            )
+            return embedding.astype(np.float32, copy=False)
+
+        features = batch_to_device(self._preprocess([text]), self.model.device)
+        with torch.inference_mode():
+            embedding = self.model(features)["sentence_embedding"]
+            embedding = torch.nn.functional.normalize(embedding, p=2, dim=1)
+
+        # float32 even when the GPU model outputs FP16
+        return embedding[0].float().cpu().numpy()
+
+    def _cache_key(self, text: str) -> bytes:
+        """
+        Key for a text in the embed_text cache.
+        
+        A 16-byte BLAKE2b digest, so the cache doesn't keep whole chunk
+        texts alive and dict lookups don't re-hash long strings.
+        """
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _remember_embedding(self, key: bytes, embedding: np.ndarray) -> None:
+        """Add an embedding to the LRU cache, evicting the oldest if full."""
+        # Read-only, so the cached value can't be changed through a view;
+        # callers get copies
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+        self._embed_text_cache[key] = embedding
+        self._embed_text_cache.move_to_end(key)
+        if len(self._embed_text_cache) > self.EMBED_TEXT_CACHE_SIZE:
+            self._embed_text_cache.popitem(last=False)
+
+    def _open_cache_db(self, path: str) -> sqlite3.Connection:
         """
-        embedding = self.model.encode(
-            text,
-            convert_to_numpy=True,
-            normalize_embeddings=True # for better similarity search
+        Open (or create) the on-disk embedding cache.
+        
+        Args:
+            path: sqlite file to use; its directory is created if missing
+            
+        Returns:
+            sqlite3.Connection: Shared by every thread, guarded by _cache_db_lock
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key BLOB NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, key)) WITHOUT ROWID"
         )
+        db.commit()
+        print(f"Embedding cache: {path}")
+        return db
 
-        # Covnert numpy array to list (for JSON serialisation)
-        return embedding.tolist()
+    def _load_from_disk(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Look keys up in the on-disk cache; returns only the ones found."""
+        if self._cache_db is None or not keys:
+            return {}
+        
+        found = {}
+        with self._cache_db_lock:
+            # Stay under sqlite's limit on bound parameters
+            for start in range(0, len(keys), self.CACHE_DB_BATCH):
+                batch = keys[start:start + self.CACHE_DB_BATCH]
+                rows = self._cache_db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? "
+                    f"AND key IN ({', '.join('?' * len(batch))})",
+                    [self._cache_db_model, *batch]
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def _save_to_disk(self, items: List[Tuple[bytes, np.ndarray]]) -> None:
+        """Write embeddings to the on-disk cache in one transaction."""
+        if self._cache_db is None or not items:
+            return
+        
+        with self._cache_db_lock, self._cache_db:
+            # Stored as float32 so a disk hit is bit-identical to the
+            # embedding it replaces
+            self._cache_db.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                [
+                    (self._cache_db_model, key, np.asarray(embedding, dtype=np.float32).tobytes())
+                    for key, embedding in items
+                ]
+            )
     
     # Embedding multiple texts (Batch Processing)
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
         """
         Convert multiple texts into embeddings efficiently.
         
@@ -73,32 +420,22 @@ class EmbeddingService:
             texts: List of text strings
             
         Returns:
-            List of embedding vectors
+            np.ndarray: float32 matrix with one embedding row per text
             
         Example:
             >>> texts = ["Hello world", "Goodbye world", "Python is fun"]
             >>> vectors = service.embed_texts(texts)
-            >>> len(vectors)
-            3
-            >>> len(vectors[0])
-            384
+            >>> vectors.shape
+            (3, 384)
         """
         if not texts:
-            return []
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
         
         print(f"Embedding {len(texts)} text chunks...")
 
-        # Batch encoding is much faster!
-        embeddings = self.model.encode(
-            texts,
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-            show_progress_bar=True,  # Show progress for large batches
-            batch_size=32  # Process 32 texts at a time
-        )
-        
-        # Convert to list of lists
-        return embeddings.tolist()
+        # Batch encoding is much faster! Texts seen before come from the
+        # cache; the rest are encoded together
+        return self._cached_embeddings(texts, show_progress_bar=True)
 
     # Embed document chunks
     async def embed_chunks(
@@ -116,33 +453,163 @@ class EmbeddingService:
         Returns:
             List of DocumentChunk objects with embeddings filled in
             
+        The embeddings are stored as one contiguous float32 (N, dim) matrix
+        per call - the same precision ChromaDB stores and queries use. Each
+        chunk's embedding is a row view into it, not a separate array.
+            
         Example:
             Input chunk:  DocumentChunk(text="Hello", embedding=None)
-            Output chunk: DocumentChunk(text="Hello", embedding=[0.234, -0.123, ...])
+            Output chunk: DocumentChunk(text="Hello", embedding=array([0.234, -0.123, ...], dtype=float32))
         """
         if not chunks:
             return []
         
         print(f"Generating embeddings for {len(chunks)} chunks...")
     
-        batch_size = 50
-        total_batches = (len(chunks) + batch_size - 1) // batch_size
+        # Hand the texts to the batching worker, which may encode them
+        # together with chunks from other documents uploaded at the same time
+        texts = [chunk.text for chunk in chunks]
+        embeddings = await self._submit(texts)
         
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            
-            print(f"Batch {batch_num}/{total_batches} ({len(batch)} chunks)...")
-            
-            texts = [chunk.text for chunk in batch]
-            embeddings = self.model.encode(texts, show_progress_bar=False)
-            
-            for chunk, embedding in zip(batch, embeddings):
-                chunk.embedding = embedding.tolist()
+        # Row views - the chunks share the matrix rather than each owning
+        # a copy of its vector
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk.embedding = embedding
         
         print(f"All embeddings generated!")
         return chunks
     
+    async def embed_query(self, text: str) -> np.ndarray:
+        """
+        Async embed_text for request handlers.
+        
+        Cache misses go through the batching worker, so concurrent queries
+        share one forward pass instead of each blocking the event loop.
+        
+        Args:
+            text: The text to embed
+            
+        Returns:
+            np.ndarray: The normalized float32 embedding, same as embed_text
+        """
+        key = self._cache_key(text)
+        cached = self._embed_text_cache.get(key)
+        if cached is not None:
+            self._embed_text_cache.move_to_end(key)
+            return cached.copy()
+        
+        # sqlite reads/writes block, so they run in the thread pool rather
+        # than on the event loop
+        if self._cache_db is not None:
+            cached = (await run_in_threadpool(self._load_from_disk, [key])).get(key)
+            if cached is not None:
+                self._remember_embedding(key, cached)
+                return cached.copy()
+        
+        rows = await self._submit([text])
+        self._remember_embedding(key, rows[0])
+        if self._cache_db is not None:
+            await run_in_threadpool(self._save_to_disk, [(key, rows[0])])
+        return rows[0]
+
+    async def _submit(self, texts: List[str]) -> np.ndarray:
+        """Queue texts for the batching worker and wait for their rows."""
+        future = asyncio.get_running_loop().create_future()
+        await self._get_queue().put((texts, future))
+        return await future
+
+    def _get_queue(self) -> asyncio.Queue:
+        """Return the batching queue, starting its worker on first use."""
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._queue_loop is not loop:
+            self._queue = asyncio.Queue()
+            self._queue_loop = loop
+            self._worker_task = loop.create_task(self._embed_worker(self._queue))
+        return self._queue
+
+    async def aclose(self) -> None:
+        """Stop the batching worker (called on app shutdown)."""
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+            self._queue = None
+
+    async def _embed_worker(self, queue: asyncio.Queue) -> None:
+        """
+        Drain queued embed requests and encode them in one call.
+        
+        Runs for the lifetime of the event loop. Each queue item is a
+        (texts, future) tuple; the future receives that
+        request's rows.
+        """
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            requests: List[Tuple[List[str], asyncio.Future]] = [await queue.get()]
+            num_texts = len(requests[0][0])
+            
+            # Give concurrent requests a moment to join this batch
+            deadline = loop.time() + self.BATCH_WAIT_SECONDS
+            while num_texts < self.MAX_BATCH_TEXTS and len(requests) < self.MAX_BATCH_REQUESTS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                num_texts += len(request[0])
+            
+            try:
+                # Off the event loop, so other requests keep being served
+                results = await run_in_threadpool(self._encode_requests, requests)
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            if len(requests) > 1:
+                print(f"Batched {len(requests)} requests ({num_texts} texts) into one encode call")
+            
+            for (_, future), rows in zip(requests, results):
+                if not future.done():
+                    future.set_result(rows)
+
+    def _encode_requests(self, requests: List[Tuple[List[str], asyncio.Future]]) -> List[np.ndarray]:
+        """
+        Encode every queued request's texts in one model call.
+        
+        Rows are float32, the precision ChromaDB stores: narrowing chunk
+        rows to float16 would only add rounding to the stored vectors,
+        since the DB upcasts them on insert anyway.
+        
+        Returns:
+            One float32 matrix per request, in queue order
+        """
+        all_texts = [text for texts, _ in requests for text in texts]
+        embeddings = self.model.encode(
+            all_texts,
+            batch_size=max(self.batch_size, 128),
+            convert_to_tensor=True,
+            normalize_embeddings=True,  # Match embed_text so query/chunk scores line up
+            show_progress_bar=False
+        )
+        
+        results = []
+        start = 0
+        for texts, _ in requests:
+            # float() upcasts the GPU model's FP16 output
+            rows = embeddings[start:start + len(texts)].float()
+            results.append(rows.cpu().numpy())
+            start += len(texts)
+        return results
+
     # Calculate similarity between two texts
     def calculate_similarity(self, text1: str, text2: str) -> float:
         """
@@ -165,14 +632,88 @@ class EmbeddingService:
             >>> service.calculate_similarity("cat", "car")
             0.23
         """
-        # Getting embeddings
-        emb1 = np.array(self.embed_text(text1))
-        emb2 = np.array(self.embed_text(text2))
+        # Both texts as one float32 matrix - cached texts skip the model,
+        # the rest share one forward pass
+        embeddings = self._cached_embeddings([text1, text2])
 
-        # Cosine similarity
-        similarity = np.dot(emb1, emb2)
+        # Cosine similarity - every encode uses normalize_embeddings=True,
+        # so the vectors are unit length and no norms or division are needed
+        similarity = embeddings[0] @ embeddings[1]
 
         return float(similarity)
+
+    def pairwise_similarity(self, texts: List[str]) -> np.ndarray:
+        """
+        Calculate the similarity of every text to every other text.
+        
+        Each text is embedded once, then all pairs come out of a single
+        matrix product instead of one calculate_similarity call per pair.
+        
+        Args:
+            texts: Texts to compare
+            
+        Returns:
+            np.ndarray: (len(texts), len(texts)) float32 matrix where
+            [i, j] is the similarity of texts[i] and texts[j]
+        """
+        embeddings = self._cached_embeddings(texts)
+
+        # Unit-length rows, so the Gram matrix is the cosine matrix
+        return embeddings @ embeddings.T
+
+    def _cached_embeddings(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Embed texts as a float32 matrix, going through the embed_text cache.
+        
+        Only texts that aren't cached are sent to the model, in a single
+        encode call, and they're cached for next time.
+        
+        Args:
+            texts: Texts to embed
+            show_progress_bar: Show the model's progress bar while encoding
+            
+        Returns:
+            np.ndarray: One normalized row per text, in input order
+        """
+        keys = [self._cache_key(text) for text in texts]
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        
+        misses = []
+        for i, key in enumerate(keys):
+            cached = self._embed_text_cache.get(key)
+            if cached is None:
+                misses.append(i)
+            else:
+                self._embed_text_cache.move_to_end(key)
+                embeddings[i] = cached
+        
+        if misses:
+            found = self._load_from_disk([keys[i] for i in misses])
+            still_missing = []
+            for i in misses:
+                cached = found.get(keys[i])
+                if cached is None:
+                    still_missing.append(i)
+                else:
+                    embeddings[i] = cached
+                    self._remember_embedding(keys[i], cached)
+            misses = still_missing
+        
+        if misses:
+            # FP16 on GPU - the assignment upcasts into the float32 matrix
+            encoded = self.model.encode(
+                [texts[i] for i in misses],
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=show_progress_bar,
+                batch_size=self.batch_size  # 32 texts at a time on CPU, 256 on GPU
+            )
+            embeddings[misses] = encoded
+            for i in misses:
+                self._remember_embedding(keys[i], embeddings[i])
+            self._save_to_disk([(keys[i], embeddings[i]) for i in misses])
+        
+        return embeddings
     
 if __name__ == "__main__":
     """
@@ -5,6 +5,7 @@ and generates answers using an LLM.
 """
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings as ChromaSettings
 from typing import List, Tuple, Optional
 import google.generativeai as genai
@@ -19,6 +20,28 @@ from app.models import (
 from app.config import get_settings
 from app.services.embedding_services import EmbeddingService
 
+def create_chroma_client():
+    """
+    Create the ChromaDB client.
+    
+    Call this once per process and pass the result to RAGService, so
+    every request reuses the same client (and its connection pool).
+    """
+    # Local development
+    return chromadb.Client(
+        ChromaSettings(
+            persist_directory="./chroma_data",  # Where to save data
+            anonymized_telemetry=False
+        )
+    )
+
+    # For Docker (uncomment when using docker-compose)
+    # settings = get_settings()
+    # return chromadb.HttpClient(
+    #     host=settings.chroma_host,
+    #     port=settings.chroma_port
+    # )
+
 class RAGService:
     """
     Handles the full RAG pipeline:
@@ -27,26 +50,19 @@ class RAGService:
     3. Generate answers using retrieved context
     """
 
-    def __init__(self):
+    def __init__(
+            self,
+            embedding_service: Optional[EmbeddingService] = None,
+            chroma_client=None
+    ):
         self.settings = get_settings()
-        self.embedding_service = EmbeddingService()
+
+        # Share the app's EmbeddingService when given one, so the model is only loaded once
+        self.embedding_service = embedding_service or EmbeddingService()
 
         # Initialising ChromaDB
         print("Connecting to ChromaDB...")
-
-        # Local development
-        self.chroma_client = chromadb.Client(
-            ChromaSettings(
-                persist_directory="./chroma_data",  # Where to save data
-                anonymized_telemetry=False
-            )
-        )
-
-        # For Docker (uncomment when using docker-compose)
-        # self.chroma_client = chromadb.HttpClient(
-        #     host=self.settings.chroma_host,
-        #     port=self.settings.chroma_port
-        # )
+        self.chroma_client = chroma_client or create_chroma_client()
 
         # Get or create collection
         self.collection = self.chroma_client.get_or_create_collection(
@@ -64,6 +80,9 @@ class RAGService:
         # Stats tracking
         self.total_queries = 0
 
+        # Unique document IDs, loaded lazily and kept in sync on writes
+        self._document_ids: Optional[set] = None
+
     # Storing chunks in vector database
     async def store_chunks(self, chunks: List[DocumentChunk]) -> None:
         """
@@ -82,7 +101,6 @@ class RAGService:
             # Prepare data for ChromaDB
             ids = [chunk.chunk_id for chunk in chunks]
             documents = [chunk.text for chunk in chunks]
-            embeddings = [chunk.embedding for chunk in chunks]
             
             # Prepare metadatas - use dictionary access
             metadatas = []
@@ -98,9 +116,16 @@ class RAGService:
                 metadatas.append(metadata)
             
             # Validate embeddings
-            if any(emb is None for emb in embeddings):
+            if any(chunk.embedding is None for chunk in chunks):
                 raise ValueError("Some chunks are missing embeddings")
             
+            # ChromaDB stores vectors as float32, so hand it one contiguous
+            # float32 matrix instead of nested lists of Python floats
+            embeddings = np.asarray(
+                [chunk.embedding for chunk in chunks],
+                dtype=np.float32
+            )
+            
             # Add to ChromaDB collection
             self.collection.add(
                 ids=ids,
@@ -108,6 +133,9 @@ class RAGService:
                 embeddings=embeddings,
                 metadatas=metadatas
             )
+
+            if self._document_ids is not None:
+                self._document_ids.update(chunk.document_id for chunk in chunks)
             
             print(f"✅ Successfully stored {len(chunks)} chunks")
             
@@ -117,6 +145,28 @@ class RAGService:
             traceback.print_exc()
             raise
     
+    # Counting documents
+    def count_documents(self) -> int:
+        """
+        Number of unique documents in the collection.
+        
+        The first call reads just the metadatas from ChromaDB to build
+        the set of document IDs; after that store_chunks and
+        delete_document keep it up to date, so this is O(1).
+        
+        Returns:
+            int: Number of unique documents
+        """
+        if self._document_ids is None:
+            results = self.collection.get(include=["metadatas"])
+            self._document_ids = {
+                meta['document_id']
+                for meta in results['metadatas']
+                if meta and 'document_id' in meta
+            }
+        
+        return len(self._document_ids)
+
     # Searching for relevant chunks
     async def search_similar_chunks(
             self,
@@ -140,8 +190,9 @@ class RAGService:
             2. ChromaDB finds chunks with similar embeddings
             3. Return top-k most similar chunks
         """
-        # Generate embedding for query
-        query_embedding = self.embedding_service.embed_text(query)
+        # Generate embedding for query (batched with concurrent queries,
+        # off the event loop)
+        query_embedding = await self.embedding_service.embed_query(query)
 
         # Build filter if document_ids provided
         where_filter = None
@@ -150,7 +201,7 @@ class RAGService:
 
         # Search ChromaDB
         results = self.collection.query(
-            query_embeddings=query_embedding,
+            query_embeddings=[query_embedding],
             n_results=num_results,
             where=where_filter,
             include=["documents", "metadatas", "distances"]
@@ -239,8 +290,10 @@ class RAGService:
                 f"[Source {idx} - {chunk_info['filename']}]\n{chunk_info['text']}"
             )
 
-            # Create source object
-            source = Source(
+            # Create source object - fields come straight from our own
+            # search results (similarity is 1/(1+d), always in (0, 1]), so
+            # skip validation like _build_chunks does for DocumentChunk
+            source = Source.model_construct(
                 document_name=chunk_info["filename"],
                 chunk_id=chunk_info['chunk_id'],
                 relevance_score=round(chunk_info['similarity'], 3),
@@ -345,15 +398,7 @@ Please answer the question based on the context provided above. If you reference
         total_chunks = self.collection.count()
 
         # Count unique documents
-        if total_chunks > 0:
-            all_metadata = self.collection.get(include=["metadatas"])
-            unique_docs = set(
-                meta['document_id'] 
-                for meta in all_metadata['metadatas']
-            )
-            total_documents = len(unique_docs)
-        else:
-            total_documents = 0
+        total_documents = self.count_documents() if total_chunks > 0 else 0
         
         return SystemStats(
             total_documents=total_documents,
@@ -384,6 +429,8 @@ Please answer the question based on the context provided above. If you reference
 
         if chunk_ids:
             self.collection.delete(ids=chunk_ids)
+            if self._document_ids is not None:
+                self._document_ids.discard(document_id)
             print(f"Deleted {len(chunk_ids)} chunks for document {document_id}")
         
         return len(chunk_ids)
@@ -2,10 +2,19 @@
 
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 import time
 import pandas as pd
+import numpy as np
+import json
+import orjson
 import re
+import traceback
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # ============================================================================
 # Configuration
@@ -13,6 +22,32 @@ import re
 
 API_URL = "http://127.0.0.1:8000"
 
+# (connect, read) timeout for calls that wait on extraction or the LLM
+LONG_REQUEST_TIMEOUT = (5, 120)
+
+# Preview quality checks - compiled once, not on every button click
+STRAY_CAPITAL_RE = re.compile(r'(?<!\S)[B-HJ-Z](?!\S)')  # Lone capitals other than A/I
+CONSONANT_CLUSTER_RE = re.compile(r'[bcdfghjklmnpqrstvwxyz]{6,}', re.IGNORECASE)
+
+# Every code point str.isspace() (and so regex \s) counts as whitespace,
+# for finding runs of spaces with numpy instead of a regex scan
+WHITESPACE_CODEPOINTS = np.array([
+    *range(0x09, 0x0e), *range(0x1c, 0x21), 0x85, 0xa0, 0x1680,
+    *range(0x2000, 0x200b), 0x2028, 0x2029, 0x202f, 0x205f, 0x3000
+], dtype=np.uint32)
+
+# Chunk size histogram buckets for the preview analysis tab
+CHUNK_SIZE_BINS = [0, 200, 400, 600, 800, 1000, np.inf]
+CHUNK_SIZE_LABELS = ["0-200", "200-400", "400-600", "600-800", "800-1000", "1000+"]
+
+# Full text preview is shown a page at a time so reruns stay small
+PREVIEW_PAGE_CHARS = 50_000
+SEARCH_CONTEXT_CHARS = 200  # Characters shown either side of a match
+MAX_SEARCH_WINDOWS = 100
+
+# Chat history is drawn this many messages at a time
+HISTORY_PAGE_SIZE = 20
+
 # ============================================================================
 # Page Configuration
 # ============================================================================
@@ -71,22 +106,208 @@ if 'messages' not in st.session_state:
 if 'agent_conversation' not in st.session_state:
     st.session_state.agent_conversation = []
 
+# How many of the most recent chat messages to draw
+if 'history_limit' not in st.session_state:
+    st.session_state.history_limit = HISTORY_PAGE_SIZE
+
 # ============================================================================
 # Helper Functions
 # ============================================================================
 
+@st.cache_resource
+def get_session():
+    """
+    One pooled HTTP session for the whole app.
+    
+    Streamlit re-runs this script on every interaction, so the session is
+    cached as a resource - otherwise each rerun would open new connections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=16,
+        # Retry dropped/refused connections briefly (e.g. backend reloading);
+        # urllib3 won't resend a POST once the server has received it
+        max_retries=Retry(total=2, backoff_factor=0.1)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+def get_search_pattern(search_term):
+    """
+    Case-insensitive pattern for a preview search term.
+    
+    Kept in session state so reruns with the same term reuse the compiled
+    pattern instead of compiling it again.
+    """
+    pattern = st.session_state.get("search_pattern")
+    if pattern is None or pattern.pattern != re.escape(search_term):
+        pattern = re.compile(re.escape(search_term), re.IGNORECASE)
+        st.session_state.search_pattern = pattern
+    return pattern
+
+def count_whitespace_runs(text, min_length=4):
+    """
+    Count runs of at least min_length whitespace characters.
+    
+    Same result as counting re.finditer(r'\s{4,}', text) matches, but done
+    as a few vectorised numpy passes over the text's code points.
+    
+    Returns:
+        int: Number of whitespace runs
+    """
+    if len(text) < min_length:
+        return 0
+    
+    codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    is_space = np.isin(codepoints, WHITESPACE_CODEPOINTS).view(np.int8)
+    
+    # +1 where a run starts, -1 just past where it ends
+    edges = np.diff(is_space, prepend=np.int8(0), append=np.int8(0))
+    run_lengths = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    return int((run_lengths >= min_length).sum())
+
+def search_preview_text(result, search_term):
+    """
+    Count search_term in a preview's full text and pull out the passages around it.
+    
+    Only the text within SEARCH_CONTEXT_CHARS of each match is returned
+    (overlapping windows are merged), so a search never renders the whole
+    document. The last search is kept in session state, so reruns that
+    don't change the term (or the document) don't rescan the text.
+    
+    Returns:
+        tuple: (number of matches, excerpts with matches marked)
+    """
+    key = (search_term, result['content_hash'])
+    last = st.session_state.get("last_search")
+    if last is not None and last[0] == key:
+        return last[1], last[2]
+    
+    text = result['full_text']
+    pattern = get_search_pattern(search_term)
+    
+    count = 0
+    windows = []
+    for match in pattern.finditer(text):
+        count += 1
+        start = max(0, match.start() - SEARCH_CONTEXT_CHARS)
+        end = match.end() + SEARCH_CONTEXT_CHARS
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = end
+        elif len(windows) < MAX_SEARCH_WINDOWS:
+            windows.append([start, end])
+    
+    excerpts = "\n\n[...]\n\n".join(
+        pattern.sub(r'>>> \g<0> <<<', text[start:end]) for start, end in windows
+    )
+    
+    st.session_state.last_search = (key, count, excerpts)
+    return count, excerpts
+
+def clear_chat():
+    """Reset the chat history (used as the Clear All button's callback)."""
+    st.session_state.messages = []
+    st.session_state.agent_conversation = []
+    st.session_state.history_limit = HISTORY_PAGE_SIZE
+
+# Partial reruns need st.fragment (Streamlit >= 1.37); older versions
+# just run the function as part of the full script
+fragment = getattr(st, "fragment", lambda fn: fn)
+
+@fragment
+def render_sources(sources, key):
+    """
+    Show a response's sources in one expander.
+    
+    The metadata is a single dataframe and one text area shows the
+    selected chunk, so the widget count doesn't grow with the number of
+    sources. As a fragment, picking a chunk only reruns this block, not
+    the whole app.
+    
+    Args:
+        sources: Source dicts from the API response
+        key: Unique prefix for this message's widget keys
+    """
+    sources_df = pd.DataFrame({
+        "Document": [source['document_name'] for source in sources],
+        "Relevance": [source['relevance_score'] for source in sources],
+        "Chunk ID": [source['chunk_id'][-8:] for source in sources]
+    }, index=pd.RangeIndex(1, len(sources) + 1, name="#"))
+    
+    with st.expander("📎 View Sources", expanded=False):
+        st.dataframe(
+            sources_df,
+            use_container_width=True,
+            column_config={"Relevance": st.column_config.NumberColumn(format="%.3f")}
+        )
+        
+        # Display chunk text if available
+        with_text = [i for i, source in enumerate(sources) if source.get('chunk_text')]
+        if with_text:
+            selected = st.selectbox(
+                "📖 View chunk content",
+                with_text,
+                format_func=lambda i: f"Source {i + 1} - {sources[i]['document_name']}",
+                key=f"{key}_source"
+            )
+            st.text_area(
+                "Chunk text:",
+                value=sources[selected]['chunk_text'],
+                height=200,
+                label_visibility="collapsed",
+                disabled=True,
+                key=f"{key}_chunk_{selected}"
+            )
+
+@st.cache_resource
+def get_api_executor():
+    """
+    Thread pool for running independent API calls (health + stats) side by side.
+    
+    Cached as a resource like get_session, so every rerun shares one pool
+    instead of starting threads that are never shut down.
+    """
+    return ThreadPoolExecutor(max_workers=4)
+
+def submit_api_call(fn):
+    """
+    Run fn on the API thread pool.
+    
+    The pool's threads get this rerun's ScriptRunContext, so st.cache_data
+    functions run there without "missing ScriptRunContext" warnings.
+    
+    Args:
+        fn: Zero-argument function to call
+        
+    Returns:
+        Future: Resolves to fn's return value
+    """
+    ctx = get_script_run_ctx()
+    
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn()
+    
+    return get_api_executor().submit(run)
+
+@st.cache_data(ttl=10, show_spinner=False)
 def check_api_health():
     """Check if the API is running."""
     try:
-        response = requests.get(f"{API_URL}/health", timeout=2)
+        response = get_session().get(f"{API_URL}/health", timeout=2)
         return response.status_code == 200
     except:
         return False
 
 def upload_document(file):
     """Upload a document to the API."""
-    files = {"file": (file.name, file.getvalue(), file.type)}
-    response = requests.post(f"{API_URL}/upload", files=files)
+    # Hand requests the file object itself rather than a getvalue() copy
+    file.seek(0)
+    files = {"file": (file.name, file, file.type)}
+    response = get_session().post(f"{API_URL}/upload", files=files, timeout=LONG_REQUEST_TIMEOUT)
     return response
 
 def query_api(question, num_contexts=4, use_agent_mode=False, conversation_history=None):
@@ -113,15 +334,26 @@ def query_api(question, num_contexts=4, use_agent_mode=False, conversation_histo
         "conversation_history": conversation_history if use_agent_mode else None
     }
     
-    response = requests.post(endpoint, json=payload)
-    return response.json()
+    response = get_session().post(endpoint, json=payload, timeout=LONG_REQUEST_TIMEOUT)
+    return orjson.loads(response.content)
+
+def get_preview_text(content_hash, file_type):
+    """Fetch the full extracted text for a previewed document."""
+    response = get_session().get(
+        f"{API_URL}/preview/text",
+        params={"content_hash": content_hash, "file_type": file_type},
+        timeout=LONG_REQUEST_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.text
 
+@st.cache_data(ttl=5, show_spinner=False)
 def get_stats():
-    """Get system statistics from the API."""
+    """Get system statistics from the API (cached for a few seconds)."""
     try:
-        response = requests.get(f"{API_URL}/stats", timeout=5)
+        response = get_session().get(f"{API_URL}/stats", timeout=5)
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         else:
             print(f"Stats endpoint returned status {response.status_code}")
             return {
@@ -145,8 +377,17 @@ with st.sidebar:
     st.title("📚 Study Buddy")
     st.markdown("---")
     
+    # The Refresh button's value is already in session state at the top of
+    # the rerun, so stale stats can be cleared before the fetch starts
+    if st.session_state.get("refresh_stats"):
+        get_stats.clear()
+    
+    # Health check and stats are independent - fetch them concurrently
+    health_future = submit_api_call(check_api_health)
+    stats_future = submit_api_call(get_stats)
+    
     # API Health Check
-    api_status = check_api_health()
+    api_status = health_future.result()
     if api_status:
         st.success("✅ API Connected")
     else:
@@ -157,7 +398,8 @@ with st.sidebar:
     
     # System Stats
     st.subheader("📊 System Stats")
-    stats = get_stats()
+    st.button("🔄 Refresh", help="Fetch the latest stats from the API", key="refresh_stats")
+    stats = stats_future.result()  # Also used by the Library tab below
     if stats:
         st.metric("Total Documents", stats.get('total_documents', 0))
         st.metric("Total Chunks", stats.get('total_chunks', 0))
@@ -284,45 +526,22 @@ with tab1:
         st.markdown("---")
         st.info("💡 **Tip:** If using Agent Mode, I'll remember our conversation! You can ask follow-up questions like 'tell me more' or 'what about chloroplasts?'")
     
-    # Display chat messages
-    for msg_idx, message in enumerate(st.session_state.messages):
+    # Display chat messages - only the most recent ones, so a long session
+    # doesn't redraw its whole history on every rerun
+    if len(st.session_state.messages) > st.session_state.history_limit:
+        if st.button("⬆️ Show earlier messages"):
+            st.session_state.history_limit += HISTORY_PAGE_SIZE
+    
+    first_shown = max(0, len(st.session_state.messages) - st.session_state.history_limit)
+    for msg_idx in range(first_shown, len(st.session_state.messages)):
+        message = st.session_state.messages[msg_idx]
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
             
             # Display sources if available
             if message["role"] == "assistant" and "sources" in message:
                 if message["sources"]:
-                    with st.expander("📎 View Sources", expanded=False):
-                        for i, source in enumerate(message["sources"], 1):
-                            # Source header
-                            col1, col2, col3 = st.columns([2, 1, 1])
-                            
-                            with col1:
-                                st.markdown(f"### 📄 Source {i}")
-                                st.caption(f"`{source['document_name']}`")
-                            
-                            with col2:
-                                st.metric("Relevance", f"{source['relevance_score']:.3f}")
-                            
-                            with col3:
-                                st.caption("Chunk ID")
-                                st.code(source['chunk_id'][-8:], language=None)
-                            
-                            # Display chunk text if available
-                            if source.get('chunk_text'):
-                                with st.expander("📖 View chunk content", expanded=False):
-                                    st.text_area(
-                                        "Chunk text:",
-                                        value=source['chunk_text'],
-                                        height=200,
-                                        label_visibility="collapsed",
-                                        disabled=True,
-                                        key=f"chunk_msg{msg_idx}_src{i}_{source['chunk_id'][:8]}"
-                                    )
-                            
-                            # Add divider between sources
-                            if i < len(message["sources"]):
-                                st.divider()
+                    render_sources(message["sources"], key=f"msg{msg_idx}")
     
     # Chat input
     if prompt := st.chat_input("Ask a question about your study materials..."):
@@ -373,35 +592,7 @@ with tab1:
                     
                     # Display sources
                     if sources:
-                        with st.expander("📎 View Sources", expanded=False):
-                            for i, source in enumerate(sources, 1):
-                                col1, col2, col3 = st.columns([2, 1, 1])
-                                
-                                with col1:
-                                    st.markdown(f"### 📄 Source {i}")
-                                    st.caption(f"`{source['document_name']}`")
-                                
-                                with col2:
-                                    st.metric("Relevance", f"{source['relevance_score']:.3f}")
-                                
-                                with col3:
-                                    st.caption("Chunk ID")
-                                    st.code(source['chunk_id'][-8:], language=None)
-                                
-                                # Display chunk text
-                                if source.get('chunk_text'):
-                                    with st.expander("📖 View chunk content", expanded=False):
-                                        st.text_area(
-                                            "Chunk text:",
-                                            value=source['chunk_text'],
-                                            height=200,
-                                            label_visibility="collapsed",
-                                            disabled=True,
-                                            key=f"chunk_{source['chunk_id']}_{i}"
-                                        )
-                                
-                                if i < len(sources):
-                                    st.divider()
+                        render_sources(sources, key=f"msg{len(st.session_state.messages)}")
                     
                     # Save to session state
                     st.session_state.messages.append({
@@ -410,6 +601,12 @@ with tab1:
                         "sources": sources
                     })
                     
+                    # Chunk text is only kept for recent messages - older
+                    # ones keep their source table but not the full chunks
+                    if len(st.session_state.messages) > HISTORY_PAGE_SIZE:
+                        for source in st.session_state.messages[-HISTORY_PAGE_SIZE - 1].get("sources", []):
+                            source.pop('chunk_text', None)
+                    
                     # Track assistant response in agent conversation
                     if use_agent:
                         st.session_state.agent_conversation.append({
@@ -443,10 +640,9 @@ with tab1:
                 st.success("✓ Conversation reset! Agent will treat next question as new topic.")
         
         with clear_col3:
-            if st.button("🗑️ Clear All", use_container_width=True, help="Clear entire chat history"):
-                st.session_state.messages = []
-                st.session_state.agent_conversation = []
-                st.rerun()
+            # on_click runs before the next rerun draws anything, so the
+            # history is already empty without an extra st.rerun()
+            st.button("🗑️ Clear All", use_container_width=True, help="Clear entire chat history", on_click=clear_chat)
 
 # ============================================================================
 # TAB 2: Upload Documents
@@ -501,8 +697,9 @@ with tab2:
                         progress_bar.progress(100)
                         status_text.text("✅ Complete!")
                         
-                        result = response.json()
+                        result = orjson.loads(response.content)
                         st.success("✅ Document uploaded successfully!")
+                        get_stats.clear()  # Counts just changed
                         
                         # Display results
                         col_a, col_b, col_c = st.columns(3)
@@ -553,8 +750,7 @@ with tab2:
 with tab3:
     st.markdown("### 📖 Document Library")
     
-    stats = get_stats()
-    
+    # stats was already fetched for the sidebar on this run
     if stats:
         total_docs = stats.get('total_documents', 0)
         total_chunks = stats.get('total_chunks', 0)
@@ -622,278 +818,314 @@ with tab4:
                     preview_file.seek(0)
                     
                     # Call preview endpoint
-                    files = {"file": (preview_file.name, preview_file.getvalue(), preview_file.type)}
-                    response = requests.post(f"{API_URL}/preview", files=files)
+                    files = {"file": (preview_file.name, preview_file, preview_file.type)}
+                    response = get_session().post(f"{API_URL}/preview", files=files, timeout=LONG_REQUEST_TIMEOUT)
                     
                     if response.status_code == 200:
-                        result = response.json()
-                        
-                        # Display extraction stats
-                        st.markdown("---")
-                        st.markdown("### 📊 Extraction Statistics")
-                        
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("Characters", f"{result['extracted_length']:,}")
-                        with col2:
-                            st.metric("Words", f"{result['word_count']:,}")
-                        with col3:
-                            st.metric("Lines", f"{result['line_count']:,}")
-                        with col4:
-                            st.metric("File Type", result['file_type'].upper())
-                        
-                        # Display chunking stats
-                        st.markdown("---")
-                        st.markdown("### 🧩 Chunking Statistics")
-                        
-                        chunk_stats = result['chunk_stats']
-                        
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("Total Chunks", chunk_stats['total_chunks'])
-                        with col2:
-                            st.metric("Avg Size", f"{chunk_stats['avg_chunk_size']:.0f} chars")
-                        with col3:
-                            st.metric("Min Size", f"{chunk_stats['min_chunk_size']} chars")
-                        with col4:
-                            st.metric("Max Size", f"{chunk_stats['max_chunk_size']} chars")
-                        
-                        # Quality check
-                        st.markdown("---")
-                        st.markdown("### ✅ Quality Check")
-                        
-                        quality_issues = []
-                        text = result['full_text']
-                        
-                        # Check for common OCR issues
-                        single_letters = len([w for w in text.split() if len(w) == 1 and w.isupper() and w not in ['A', 'I']])
-                        if single_letters > 50:
-                            quality_issues.append(f"⚠️ {single_letters} stray single capital letters detected")
-                        
-                        consonant_clusters = len(re.findall(r'[bcdfghjklmnpqrstvwxyz]{6,}', text.lower()))
-                        if consonant_clusters > 20:
-                            quality_issues.append(f"⚠️ {consonant_clusters} unusual consonant clusters")
+                        result = orjson.loads(response.content)
                         
-                        excessive_spaces = len(re.findall(r'\s{4,}', text))
-                        if excessive_spaces > 10:
-                            quality_issues.append(f"⚠️ {excessive_spaces} instances of excessive spacing")
+                        # Full text is streamed separately to keep the JSON small
+                        result['full_text'] = get_preview_text(
+                            result['content_hash'],
+                            result['file_type']
+                        )
                         
-                        # Check chunking quality
-                        chunks = result['chunks']
-                        very_small_chunks = sum(1 for c in chunks if c['length'] < 200)
-                        very_large_chunks = sum(1 for c in chunks if c['length'] > 1500)
-                        
-                        if very_small_chunks > len(chunks) * 0.2:
-                            quality_issues.append(f"⚠️ {very_small_chunks} very small chunks (< 200 chars)")
-                        
-                        if very_large_chunks > 0:
-                            quality_issues.append(f"⚠️ {very_large_chunks} very large chunks (> 1500 chars)")
-                        
-                        if quality_issues:
-                            for issue in quality_issues:
-                                st.warning(issue)
-                        else:
-                            st.success("✅ Text extraction and chunking look good!")
-                        
-                        # Display chunks
-                        st.markdown("---")
-                        st.markdown("### 📦 Chunk Preview")
-                        
-                        # Create tabs for different views
-                        chunk_tab1, chunk_tab2, chunk_tab3 = st.tabs([
-                            f"📚 All Chunks ({len(chunks)})",
-                            "📄 Full Text",
-                            "📊 Chunk Analysis"
-                        ])
-                        
-                        with chunk_tab1:
-                            st.caption(f"Showing how the document will be split into {len(chunks)} chunks for RAG processing")
-                            
-                            # Add chunk size filter
-                            show_all = st.checkbox("Show all chunks", value=False)
-                            
-                            chunks_to_show = chunks if show_all else chunks[:10]
-                            
-                            if not show_all and len(chunks) > 10:
-                                st.info(f"Showing first 10 of {len(chunks)} chunks. Check 'Show all chunks' to see everything.")
-                            
-                            # Display each chunk
-                            for i, chunk in enumerate(chunks_to_show, 1):
-                                with st.expander(
-                                    f"📦 Chunk {chunk['chunk_index'] + 1} - {chunk['length']} chars, {chunk['word_count']} words",
-                                    expanded=(i <= 3)  # First 3 chunks expanded
-                                ):
-                                    # Chunk metadata
-                                    col1, col2, col3 = st.columns(3)
-                                    with col1:
-                                        st.caption(f"**Index:** {chunk['chunk_index']}")
-                                    with col2:
-                                        st.caption(f"**Characters:** {chunk['length']}")
-                                    with col3:
-                                        st.caption(f"**Words:** {chunk['word_count']}")
-                                    
-                                    # Chunk content
-                                    st.markdown("**Content:**")
-                                    st.text_area(
-                                        "Chunk text:",
-                                        value=chunk['text'],
-                                        height=200,
-                                        label_visibility="collapsed",
-                                        disabled=True,
-                                        key=f"preview_chunk_{chunk['chunk_id']}"
-                                    )
-                                    
-                                    # Show where chunk starts
-                                    st.caption(f"**Starts with:** {chunk['first_line'][:100]}...")
-                        
-                        with chunk_tab2:
-                            st.caption("Complete extracted text")
-                            
-                            # Add search functionality
-                            search_term = st.text_input(
-                                "🔍 Search in text:", 
-                                key="search_preview_full",
-                                placeholder="Enter text to search..."
-                            )
-                            
-                            if search_term:
-                                count = result['full_text'].lower().count(search_term.lower())
-                                st.success(f"✨ Found **{count}** occurrence(s)")
-                                
-                                highlighted_text = re.sub(
-                                    f'({re.escape(search_term)})',
-                                    r'>>> \1 <<<',
-                                    result['full_text'],
-                                    flags=re.IGNORECASE
-                                )
-                                st.text_area(
-                                    "Content:",
-                                    value=highlighted_text,
-                                    height=500,
-                                    label_visibility="collapsed",
-                                    disabled=True,
-                                    key="preview_full_search"
-                                )
-                            else:
-                                st.text_area(
-                                    "Content:",
-                                    value=result['full_text'],
-                                    height=500,
-                                    label_visibility="collapsed",
-                                    disabled=True,
-                                    key="preview_full"
-                                )
-                        
-                        with chunk_tab3:
-                            st.caption("Analysis of chunk distribution and quality")
-                            
-                            # Chunk size distribution
-                            st.markdown("**Chunk Size Distribution:**")
-                            
-                            chunk_sizes = [c['length'] for c in chunks]
-                            
-                            # Create a simple histogram using metrics
-                            size_ranges = [
-                                ("0-200", sum(1 for s in chunk_sizes if s < 200)),
-                                ("200-400", sum(1 for s in chunk_sizes if 200 <= s < 400)),
-                                ("400-600", sum(1 for s in chunk_sizes if 400 <= s < 600)),
-                                ("600-800", sum(1 for s in chunk_sizes if 600 <= s < 800)),
-                                ("800-1000", sum(1 for s in chunk_sizes if 800 <= s < 1000)),
-                                ("1000+", sum(1 for s in chunk_sizes if s >= 1000)),
-                            ]
-                            
-                            cols = st.columns(6)
-                            for col, (range_label, count) in zip(cols, size_ranges):
-                                with col:
-                                    st.metric(f"{range_label} chars", count)
-                            
-                            st.markdown("---")
-                            
-                            # Chunk details table
-                            st.markdown("**Chunk Details:**")
-                            
-                            chunk_data = []
-                            for chunk in chunks[:20]:  # First 20 chunks
-                                chunk_data.append({
-                                    "Index": chunk['chunk_index'] + 1,
-                                    "Characters": chunk['length'],
-                                    "Words": chunk['word_count'],
-                                    "First Line": chunk['first_line'][:50] + "..." if len(chunk['first_line']) > 50 else chunk['first_line']
-                                })
-                            
-                            df = pd.DataFrame(chunk_data)
-                            st.dataframe(df, use_container_width=True, hide_index=True)
-                            
-                            if len(chunks) > 20:
-                                st.caption(f"Showing first 20 of {len(chunks)} chunks")
-                        
-                        # Download options
-                        st.markdown("---")
-                        st.markdown("### 💾 Export Options")
+                        # Keep the result so reruns (e.g. typing in the search
+                        # box below) can redraw it without calling the API again
+                        st.session_state.preview_result = result
+                        st.session_state.preview_file_name = preview_file.name
+                        st.session_state.pop("preview_error", None)
                         
+                    else:
+                        error_detail = response.json().get('detail', 'Unknown error')
+                        st.error(f"❌ Error: {error_detail}")
+                
+                except Exception as e:
+                    # Keep the exception itself; its traceback is only
+                    # formatted if someone asks to see it
+                    st.session_state.preview_error = e
+                    st.session_state.preview_file_name = preview_file.name
+                    st.session_state.pop("preview_result", None)
+        
+        preview_error = st.session_state.get("preview_error")
+        if preview_error is not None and st.session_state.get("preview_file_name") == preview_file.name:
+            st.error(f"❌ Error previewing file: {str(preview_error)}")
+            with st.expander("🐛 Debug Info"):
+                if st.checkbox("Show traceback", key="preview_show_traceback"):
+                    st.code("".join(traceback.format_exception(
+                        type(preview_error), preview_error, preview_error.__traceback__
+                    )))
+
+        result = st.session_state.get("preview_result")
+        if result is not None and st.session_state.get("preview_file_name") == preview_file.name:
+            # Display extraction stats
+            st.markdown("---")
+            st.markdown("### 📊 Extraction Statistics")
+            
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Characters", f"{result['extracted_length']:,}")
+            with col2:
+                st.metric("Words", f"{result['word_count']:,}")
+            with col3:
+                st.metric("Lines", f"{result['line_count']:,}")
+            with col4:
+                st.metric("File Type", result['file_type'].upper())
+            
+            # Display chunking stats
+            st.markdown("---")
+            st.markdown("### 🧩 Chunking Statistics")
+            
+            chunk_stats = result['chunk_stats']
+            
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Total Chunks", chunk_stats['total_chunks'])
+            with col2:
+                st.metric("Avg Size", f"{chunk_stats['avg_chunk_size']:.0f} chars")
+            with col3:
+                st.metric("Min Size", f"{chunk_stats['min_chunk_size']} chars")
+            with col4:
+                st.metric("Max Size", f"{chunk_stats['max_chunk_size']} chars")
+            
+            # Quality check
+            st.markdown("---")
+            st.markdown("### ✅ Quality Check")
+            
+            quality_issues = []
+            text = result['full_text']
+            text_length = len(text)
+            
+            # Check for common OCR issues - each is one C-level regex
+            # scan, with no split()/lower() copies of the text. The counts
+            # are stored on the result so reruns don't scan again.
+            # Plain text files never went through OCR, so they're skipped.
+            if not text or result['file_type'] == 'txt':
+                result['ocr_counts'] = (0, 0, 0)
+            elif 'ocr_counts' not in result:
+                result['ocr_counts'] = (
+                    sum(1 for _ in STRAY_CAPITAL_RE.finditer(text)),
+                    sum(1 for _ in CONSONANT_CLUSTER_RE.finditer(text)),
+                    count_whitespace_runs(text)
+                )
+            single_letters, consonant_clusters, excessive_spaces = result['ocr_counts']
+            
+            if single_letters > 50:
+                quality_issues.append(f"⚠️ {single_letters} stray single capital letters detected")
+            
+            if consonant_clusters > 20:
+                quality_issues.append(f"⚠️ {consonant_clusters} unusual consonant clusters")
+            
+            if excessive_spaces > 10:
+                quality_issues.append(f"⚠️ {excessive_spaces} instances of excessive spacing")
+            
+            # Check chunking quality
+            chunks = result['chunks']
+            chunk_sizes = np.fromiter((c['length'] for c in chunks), dtype=np.int64, count=len(chunks))
+            very_small_chunks = int((chunk_sizes < 200).sum())
+            very_large_chunks = int((chunk_sizes > 1500).sum())
+            
+            if very_small_chunks > len(chunks) * 0.2:
+                quality_issues.append(f"⚠️ {very_small_chunks} very small chunks (< 200 chars)")
+            
+            if very_large_chunks > 0:
+                quality_issues.append(f"⚠️ {very_large_chunks} very large chunks (> 1500 chars)")
+            
+            if quality_issues:
+                for issue in quality_issues:
+                    st.warning(issue)
+            else:
+                st.success("✅ Text extraction and chunking look good!")
+            
+            # Display chunks
+            st.markdown("---")
+            st.markdown("### 📦 Chunk Preview")
+            
+            # Create tabs for different views
+            chunk_tab1, chunk_tab2, chunk_tab3 = st.tabs([
+                f"📚 All Chunks ({len(chunks)})",
+                "📄 Full Text",
+                "📊 Chunk Analysis"
+            ])
+            
+            with chunk_tab1:
+                st.caption(f"Showing how the document will be split into {len(chunks)} chunks for RAG processing")
+                
+                # Add chunk size filter
+                show_all = st.checkbox("Show all chunks", value=False)
+                
+                chunks_to_show = chunks if show_all else chunks[:10]
+                
+                if not show_all and len(chunks) > 10:
+                    st.info(f"Showing first 10 of {len(chunks)} chunks. Check 'Show all chunks' to see everything.")
+                
+                # Display each chunk
+                for i, chunk in enumerate(chunks_to_show, 1):
+                    with st.expander(
+                        f"📦 Chunk {chunk['chunk_index'] + 1} - {chunk['length']} chars, {chunk['word_count']} words",
+                        expanded=(i <= 3)  # First 3 chunks expanded
+                    ):
+                        # Chunk metadata
                         col1, col2, col3 = st.columns(3)
-                        
                         with col1:
-                            st.download_button(
-                                label="📄 Download Full Text",
-                                data=result['full_text'],
-                                file_name=f"{preview_file.name}_extracted.txt",
-                                mime="text/plain",
-                                use_container_width=True
-                            )
-                        
+                            st.caption(f"**Index:** {chunk['chunk_index']}")
                         with col2:
-                            # Create chunked text file
-                            chunked_text = ""
-                            for i, chunk in enumerate(chunks, 1):
-                                chunked_text += f"\n{'='*80}\n"
-                                chunked_text += f"CHUNK {i}/{len(chunks)}\n"
-                                chunked_text += f"Characters: {chunk['length']} | Words: {chunk['word_count']}\n"
-                                chunked_text += f"{'='*80}\n\n"
-                                chunked_text += chunk['text']
-                                chunked_text += "\n\n"
-                            
-                            st.download_button(
-                                label="📦 Download Chunks",
-                                data=chunked_text,
-                                file_name=f"{preview_file.name}_chunks.txt",
-                                mime="text/plain",
-                                use_container_width=True
-                            )
-                        
+                            st.caption(f"**Characters:** {chunk['length']}")
                         with col3:
-                            # Create JSON export
-                            import json
-                            json_export = {
-                                "filename": preview_file.name,
-                                "extracted_at": datetime.now().isoformat(),
-                                "statistics": {
-                                    "characters": result['extracted_length'],
-                                    "words": result['word_count'],
-                                    "lines": result['line_count'],
-                                    "chunks": len(chunks)
-                                },
-                                "chunk_stats": chunk_stats,
-                                "chunks": chunks
-                            }
-                            
-                            st.download_button(
-                                label="🔧 Download JSON",
-                                data=json.dumps(json_export, indent=2),
-                                file_name=f"{preview_file.name}_analysis.json",
-                                mime="application/json",
-                                use_container_width=True
-                            )
+                            st.caption(f"**Words:** {chunk['word_count']}")
                         
-                    else:
-                        error_detail = response.json().get('detail', 'Unknown error')
-                        st.error(f"❌ Error: {error_detail}")
+                        # Chunk content
+                        st.markdown("**Content:**")
+                        st.text_area(
+                            "Chunk text:",
+                            value=chunk['text'],
+                            height=200,
+                            label_visibility="collapsed",
+                            disabled=True,
+                            key=f"preview_chunk_{chunk['chunk_id']}"
+                        )
+                        
+                        # Show where chunk starts
+                        st.caption(f"**Starts with:** {chunk['first_line'][:100]}...")
+            
+            with chunk_tab2:
+                st.caption("Complete extracted text")
                 
-                except Exception as e:
-                    st.error(f"❌ Error previewing file: {str(e)}")
-                    import traceback
-                    with st.expander("🐛 Debug Info"):
-                        st.code(traceback.format_exc())
+                # Add search functionality
+                search_term = st.text_input(
+                    "🔍 Search in text:", 
+                    key="search_preview_full",
+                    placeholder="Enter text to search..."
+                )
+                
+                if search_term:
+                    count, excerpts = search_preview_text(result, search_term)
+                    st.success(f"✨ Found **{count}** occurrence(s)")
+                    
+                    if count:
+                        st.text_area(
+                            "Content:",
+                            value=excerpts,
+                            height=500,
+                            label_visibility="collapsed",
+                            disabled=True,
+                            key="preview_full_search"
+                        )
+                else:
+                    total_pages = max(1, -(-text_length // PREVIEW_PAGE_CHARS))
+                    
+                    page = 1
+                    if total_pages > 1:
+                        page = st.number_input(
+                            f"Page (of {total_pages})",
+                            min_value=1,
+                            max_value=total_pages,
+                            value=1,
+                            key="preview_full_page"
+                        )
+                    
+                    start = (page - 1) * PREVIEW_PAGE_CHARS
+                    st.text_area(
+                        "Content:",
+                        value=text[start:start + PREVIEW_PAGE_CHARS],
+                        height=500,
+                        label_visibility="collapsed",
+                        disabled=True,
+                        key="preview_full"
+                    )
+            
+            with chunk_tab3:
+                st.caption("Analysis of chunk distribution and quality")
+                
+                # Chunk size distribution
+                st.markdown("**Chunk Size Distribution:**")
+                
+                # Create a simple histogram using metrics (one pass
+                # over the sizes computed for the quality check)
+                counts, _ = np.histogram(chunk_sizes, bins=CHUNK_SIZE_BINS)
+                size_ranges = zip(CHUNK_SIZE_LABELS, counts.tolist())
+                
+                cols = st.columns(6)
+                for col, (range_label, count) in zip(cols, size_ranges):
+                    with col:
+                        st.metric(f"{range_label} chars", count)
+                
+                st.markdown("---")
+                
+                # Chunk details table
+                st.markdown("**Chunk Details:**")
+                
+                chunk_data = []
+                for chunk in chunks[:20]:  # First 20 chunks
+                    chunk_data.append({
+                        "Index": chunk['chunk_index'] + 1,
+                        "Characters": chunk['length'],
+                        "Words": chunk['word_count'],
+                        "First Line": chunk['first_line'][:50] + "..." if len(chunk['first_line']) > 50 else chunk['first_line']
+                    })
+                
+                df = pd.DataFrame(chunk_data)
+                st.dataframe(df, use_container_width=True, hide_index=True)
+                
+                if len(chunks) > 20:
+                    st.caption(f"Showing first 20 of {len(chunks)} chunks")
+            
+            # Download options
+            st.markdown("---")
+            st.markdown("### 💾 Export Options")
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.download_button(
+                    label="📄 Download Full Text",
+                    data=text,
+                    file_name=f"{preview_file.name}_extracted.txt",
+                    mime="text/plain",
+                    use_container_width=True
+                )
+            
+            with col2:
+                # Create chunked text file
+                chunked_text = ""
+                for i, chunk in enumerate(chunks, 1):
+                    chunked_text += f"\n{'='*80}\n"
+                    chunked_text += f"CHUNK {i}/{len(chunks)}\n"
+                    chunked_text += f"Characters: {chunk['length']} | Words: {chunk['word_count']}\n"
+                    chunked_text += f"{'='*80}\n\n"
+                    chunked_text += chunk['text']
+                    chunked_text += "\n\n"
+                
+                st.download_button(
+                    label="📦 Download Chunks",
+                    data=chunked_text,
+                    file_name=f"{preview_file.name}_chunks.txt",
+                    mime="text/plain",
+                    use_container_width=True
+                )
+            
+            with col3:
+                # Create JSON export
+                json_export = {
+                    "filename": preview_file.name,
+                    "extracted_at": datetime.now().isoformat(),
+                    "statistics": {
+                        "characters": result['extracted_length'],
+                        "words": result['word_count'],
+                        "lines": result['line_count'],
+                        "chunks": len(chunks)
+                    },
+                    "chunk_stats": chunk_stats,
+                    "chunks": chunks
+                }
+                
+                st.download_button(
+                    label="🔧 Download JSON",
+                    data=json.dumps(json_export, indent=2),
+                    file_name=f"{preview_file.name}_analysis.json",
+                    mime="application/json",
+                    use_container_width=True
+                )
 
 # ============================================================================
 # Footer
@@ -2,11 +2,15 @@
 
 import pytest
 from pathlib import Path
-from backend.app.services.document_services import DocumentService
+from backend.app.services.document_services import DocumentService, FileTooLargeError
 from backend.app.models import DocumentMetaData, DocumentChunk, FileType
 from backend.app.config import Settings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from semantic_text_splitter import TextSplitter
+from collections import OrderedDict
+from backend.app.services import document_services
 import tempfile
+import hashlib
 import shutil
 
 # ============================================================================
@@ -104,6 +108,13 @@ def test_text_splitter_configuration(document_service):
     assert document_service.text_splitter._chunk_overlap == document_service.settings.chunk_overlap
 
 
+def test_chunk_splitter_configuration(document_service):
+    """Test that the chunk splitter is built once with the class sizing"""
+    assert isinstance(document_service.chunk_splitter, TextSplitter)
+    chunks = document_service.chunk_splitter.chunks("word " * 1000)
+    assert all(len(c) <= DocumentService.CHUNK_SIZE for c in chunks)
+
+
 # ============================================================================
 # Test save_file
 # ============================================================================
@@ -156,6 +167,48 @@ async def test_save_file_in_upload_dir(document_service):
     assert saved_path.parent == document_service.upload_dir
 
 
+@pytest.mark.asyncio
+async def test_save_file_sanitizes_filename(document_service):
+    """Test that directory parts and odd characters can't escape upload_dir"""
+    saved_path = await document_service.save_file("../../etc/my notes?.txt", b"data")
+    
+    assert saved_path.parent == document_service.upload_dir
+    assert saved_path.name.endswith("_my_notes_.txt")
+
+
+async def _byte_chunks(*parts):
+    """Async iterator over byte chunks, mimicking an upload stream"""
+    for part in parts:
+        yield part
+
+
+@pytest.mark.asyncio
+async def test_save_file_stream(document_service):
+    """Test streaming a file to disk in chunks"""
+    import hashlib
+
+    saved_path, size, digest = await document_service.save_file_stream(
+        "test.txt", _byte_chunks(b"Hello ", b"world"), max_size_bytes=1024
+    )
+
+    assert saved_path.read_bytes() == b"Hello world"
+    assert size == 11
+    assert digest == hashlib.sha256(b"Hello world").hexdigest()
+    assert saved_path.parent == document_service.upload_dir
+
+
+@pytest.mark.asyncio
+async def test_save_file_stream_too_large(document_service):
+    """Test that oversized streams are rejected and cleaned up"""
+    with pytest.raises(FileTooLargeError):
+        await document_service.save_file_stream(
+            "big.txt", _byte_chunks(b"a" * 10, b"b" * 10), max_size_bytes=15
+        )
+
+    # Partial file should have been removed
+    assert list(document_service.upload_dir.glob("*big.txt")) == []
+
+
 # ============================================================================
 # Test _extract_txt
 # ============================================================================
@@ -180,6 +233,20 @@ def test_extract_txt_preserves_content(document_service, tmp_path):
     assert extracted_text == expected_text
 
 
+def test_clean_text_fixes_smart_punctuation(document_service):
+    """Test that smart quotes, dashes and ellipses are normalised"""
+    text = "\u2018quoted\u2019 \u201cdouble\u201d a\u2014b c\u2013d wait\u2026"
+    
+    assert document_service._clean_text(text) == "'quoted' \"double\" a-b c-d wait..."
+
+
+def test_clean_text_whitespace(document_service):
+    """Test that spaces, line edges and blank lines are tidied"""
+    text = "  Hello    world  \n\n\n\n\n\n   next line  "
+    
+    assert document_service._clean_text(text) == "Hello world\n\n\nnext line"
+
+
 # ============================================================================
 # Test _extract_pdf
 # ============================================================================
@@ -207,6 +274,42 @@ def test_extract_pdf_with_text(document_service, tmp_path):
     assert isinstance(text, str)
 
 
+def test_iter_pdf_pages_skips_pages_without_fonts(document_service, tmp_path):
+    """Test that graphics-only pages are skipped and text pages kept"""
+    import fitz
+    
+    pdf_path = tmp_path / "mixed.pdf"
+    with fitz.open() as pdf:
+        pdf.new_page().insert_text((72, 72), "First page text")
+        pdf.new_page().draw_rect(fitz.Rect(10, 10, 100, 100))  # Drawing only
+        pdf.new_page().insert_text((72, 72), "Third page text")
+        pdf.save(pdf_path)
+    
+    pages = list(document_service.iter_pdf_pages(pdf_path))
+    
+    assert pages == ["First page text", "Third page text"]
+
+
+def test_iter_pdf_pages_parallel_keeps_page_order(document_service, tmp_path, monkeypatch):
+    """Test that large PDFs go through the worker pool and keep page order"""
+    import fitz
+    
+    pdf_path = tmp_path / "large.pdf"
+    with fitz.open() as pdf:
+        for i in range(10):
+            pdf.new_page().insert_text((72, 72), f"Page {i} text")
+        pdf.save(pdf_path)
+    
+    # Small thresholds so 10 pages are split into several pool tasks
+    monkeypatch.setattr(document_services, "_PARALLEL_PDF_MIN_PAGES", 4)
+    monkeypatch.setattr(document_services, "_PDF_PAGES_PER_TASK", 3)
+    monkeypatch.setattr(document_services.os, "cpu_count", lambda: 2)
+    
+    pages = list(document_service.iter_pdf_pages(pdf_path))
+    
+    assert pages == [f"Page {i} text" for i in range(10)]
+
+
 # ============================================================================
 # Test _extract_docx
 # ============================================================================
@@ -228,6 +331,24 @@ def test_extract_docx(document_service, tmp_path):
     assert "\n\n" in text  # Paragraphs separated by double newline
 
 
+def test_extract_docx_keeps_table_order(document_service, tmp_path):
+    """Test that table text stays between the paragraphs around it"""
+    from docx import Document
+    
+    docx_path = tmp_path / "table.docx"
+    doc = Document()
+    doc.add_paragraph("Before table")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Cell A"
+    table.cell(0, 1).text = "Cell B"
+    doc.add_paragraph("After table")
+    doc.save(str(docx_path))
+    
+    text = document_service._extract_docx(docx_path)
+    
+    assert text == "Before table\n\nCell A\n\nCell B\n\nAfter table"
+
+
 def test_extract_docx_empty_document(document_service, tmp_path):
     """Test extracting from empty DOCX"""
     from docx import Document
@@ -282,6 +403,55 @@ def test_text_extraction_unsupported_type(document_service, sample_txt):
     assert "Unsupported file type" in str(exc_info.value)
 
 
+# Content hashes are sha256 hex digests, as returned by save_file_stream
+CACHED_TEST_HASH = hashlib.sha256(b"cached test").hexdigest()
+DISK_TEST_HASH = hashlib.sha256(b"disk test").hexdigest()
+
+
+def test_extract_text_cached_reuses_result(document_service, tmp_path):
+    """Test that files with the same content hash are only extracted once"""
+    txt_path = tmp_path / "cached.txt"
+    txt_path.write_text("Original content", encoding='utf-8')
+    
+    first = document_service.extract_text_cached(txt_path, FileType.TXT, CACHED_TEST_HASH)
+    
+    # Change the file on disk - the cached result should still be returned
+    txt_path.write_text("Changed content", encoding='utf-8')
+    second = document_service.extract_text_cached(txt_path, FileType.TXT, CACHED_TEST_HASH)
+    
+    assert first == "Original content"
+    assert second == first
+
+
+def test_extract_text_cached_persists_to_disk(document_service, tmp_path, monkeypatch):
+    """Test that extracted text survives the in-memory cache being cleared"""
+    txt_path = tmp_path / "on_disk.txt"
+    txt_path.write_text("Persisted content", encoding='utf-8')
+    
+    document_service.extract_text_cached(txt_path, FileType.TXT, DISK_TEST_HASH)
+    assert (document_service.text_cache_dir / f"{DISK_TEST_HASH}.txt.txt").exists()
+    
+    # Simulate a restart: empty memory cache, file gone from uploads
+    monkeypatch.setattr(document_services, "_text_cache", OrderedDict())
+    txt_path.unlink()
+    
+    assert document_service.get_cached_text(DISK_TEST_HASH, FileType.TXT) == "Persisted content"
+
+
+@pytest.mark.parametrize("content_hash", [
+    "/tmp/outside",
+    "../../etc/passwd",
+    "A" * 64,  # Uppercase hex isn't a hexdigest
+    "hash_disk_test",
+])
+def test_get_cached_text_rejects_invalid_hash(document_service, content_hash):
+    """Test that only sha256 hex digests can name a text cache file"""
+    with pytest.raises(ValueError) as exc_info:
+        document_service.get_cached_text(content_hash, FileType.TXT)
+    
+    assert "Invalid content hash" in str(exc_info.value)
+
+
 # ============================================================================
 # Test create_chunks
 # ============================================================================
@@ -330,6 +500,61 @@ def test_create_chunks_positions(document_service, sample_metadata):
         assert chunks[i + 1].start_char >= chunks[i].start_char
 
 
+def test_create_chunks_offsets_match_source(document_service):
+    """Test that overlapping chunks map back to their own span of the source"""
+    text = " ".join(f"sentence number {i} ends here." for i in range(300))
+    
+    chunks = document_service.create_chunks(text, "doc_123", {})
+    
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert text[chunk.start_char:chunk.end_char].strip() == chunk.text
+    # Overlap means each chunk starts before the previous one ended
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt.start_char < prev.end_char
+
+
+def test_merge_small_chunks(document_service):
+    """Test that undersized chunks are folded into the previous span"""
+    min_size = document_service.settings.min_chunk_size
+    big = "x" * min_size
+    raw = [(0, big), (len(big) + 1, "tail")]
+    
+    spans = document_service._merge_small_chunks(raw)
+    
+    assert spans == [(0, len(big) + 1 + len("tail"))]
+
+
+def test_merge_small_chunks_respects_max_size(document_service):
+    """Test that merging never builds a span over max_chunk_size"""
+    max_size = document_service.settings.max_chunk_size
+    big = "x" * max_size
+    raw = [(0, big), (max_size, "tail")]
+    
+    spans = document_service._merge_small_chunks(raw)
+    
+    assert spans == [(0, max_size), (max_size, max_size + 4)]
+
+
+def test_create_chunks_streaming_matches_joined_text(document_service):
+    """Test that streamed chunks point at the right span of the joined pages"""
+    pages = [
+        "\n\n".join(f"Page {p} paragraph {i} has a few words in it." * 3 for i in range(8))
+        for p in range(20)
+    ]
+    full_text = "\n\n".join(pages)
+    
+    chunks = list(document_service.create_chunks_streaming(iter(pages), "doc_123", {}))
+    
+    assert len(chunks) > 1
+    assert [c.chunk_index for c in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert full_text[chunk.start_char:chunk.end_char] == chunk.text
+        assert len(chunk.text) <= document_service.settings.max_chunk_size
+    # Nothing is dropped between buffer flushes
+    assert chunks[-1].text.endswith(pages[-1][-20:])
+
+
 def test_create_chunks_metadata(document_service, sample_metadata):
     """Test that metadata is attached to chunks"""
     text = "Test text"
@@ -1,5 +1,6 @@
 # tests/test_embedding_service.py
 
+import asyncio
 import pytest
 import numpy as np
 from backend.app.services.embedding_services import EmbeddingService
@@ -10,12 +11,20 @@ from typing import List
 # Fixtures
 # ============================================================================
 
-@pytest.fixture
-def embedding_service():
-    """Create an EmbeddingService instance for testing"""
+@pytest.fixture(scope="session")
+def shared_embedding_service():
+    """Load the model once for the whole test session"""
     return EmbeddingService()
 
 
+@pytest.fixture
+def embedding_service(shared_embedding_service):
+    """The shared EmbeddingService, with an empty embed_text cache"""
+    # Cache tests expect texts embedded by earlier tests to be misses
+    shared_embedding_service._embed_text_cache.clear()
+    return shared_embedding_service
+
+
 @pytest.fixture
 def sample_texts():
     """Sample texts for testing"""
@@ -43,7 +52,7 @@ def sample_chunks():
             chunk_index=0,
             start_char=0,
             end_char=29,
-            metadata=metadata
+            metadata=metadata.model_dump()
         ),
         DocumentChunk(
             chunk_id="doc_1_chunk_1",
@@ -52,7 +61,7 @@ def sample_chunks():
             chunk_index=1,
             start_char=29,
             end_char=62,
-            metadata=metadata
+            metadata=metadata.model_dump()
         )
     ]
 
@@ -79,16 +88,33 @@ def test_model_loaded(embedding_service):
     assert hasattr(embedding_service.model, 'encode')
 
 
+def test_embedding_service_threads(embedding_service, monkeypatch):
+    """Test that the threads setting sizes torch's intra-op pool"""
+    import torch
+    
+    # Spy rather than resize the real pools, which the shared session
+    # model keeps using in later tests
+    calls = []
+    monkeypatch.setattr(torch, "set_num_threads", calls.append)
+    monkeypatch.setattr(torch, "set_num_interop_threads", lambda n: None)
+    monkeypatch.setattr(embedding_service, "threads", 2)
+    
+    embedding_service._configure_torch_threads()
+    
+    assert calls == [2]
+
+
 # ============================================================================
 # Test embed_text (Single Text)
 # ============================================================================
 
-def test_embed_text_returns_list(embedding_service):
-    """Test that embed_text returns a list"""
+def test_embed_text_returns_array(embedding_service):
+    """Test that embed_text returns a 1-D numpy array"""
     text = "This is a test sentence"
     embedding = embedding_service.embed_text(text)
     
-    assert isinstance(embedding, list)
+    assert isinstance(embedding, np.ndarray)
+    assert embedding.ndim == 1
 
 
 def test_embed_text_correct_dimension(embedding_service):
@@ -100,11 +126,11 @@ def test_embed_text_correct_dimension(embedding_service):
 
 
 def test_embed_text_returns_floats(embedding_service):
-    """Test that embedding contains floats"""
+    """Test that embedding contains float32 values"""
     text = "This is a test sentence"
     embedding = embedding_service.embed_text(text)
     
-    assert all(isinstance(x, float) for x in embedding)
+    assert embedding.dtype == np.float32
 
 
 def test_embed_text_normalized(embedding_service):
@@ -128,7 +154,7 @@ def test_embed_text_different_inputs(embedding_service):
     embedding2 = embedding_service.embed_text(text2)
     
     # Embeddings should be different
-    assert embedding1 != embedding2
+    assert not np.array_equal(embedding1, embedding2)
 
 
 def test_embed_text_consistent(embedding_service):
@@ -139,7 +165,76 @@ def test_embed_text_consistent(embedding_service):
     embedding2 = embedding_service.embed_text(text)
     
     # Should be identical
-    assert embedding1 == embedding2
+    assert np.array_equal(embedding1, embedding2)
+
+
+def test_embed_text_cached(embedding_service, monkeypatch):
+    """Test that repeated texts are served from the cache"""
+    text = "A question asked twice"
+    first = embedding_service.embed_text(text)
+    
+    # A second call must not touch the model
+    monkeypatch.setattr(embedding_service, "_encode_text", lambda *a, **kw: pytest.fail("_encode_text called"))
+    second = embedding_service.embed_text(text)
+    
+    assert np.array_equal(second, first)
+    assert second is not first  # Callers get their own array
+
+
+def test_embed_text_disk_cache(embedding_service, tmp_path, monkeypatch):
+    """Test that embeddings survive in the on-disk cache once the LRU is cleared"""
+    cache_db = embedding_service._open_cache_db(str(tmp_path / "embeddings.db"))
+    monkeypatch.setattr(embedding_service, "_cache_db", cache_db)
+    text = "A question asked before a restart"
+    first = embedding_service.embed_text(text)
+    
+    # As if the process restarted - only the sqlite file is left
+    embedding_service._embed_text_cache.clear()
+    monkeypatch.setattr(embedding_service, "_encode_text", lambda *a, **kw: pytest.fail("_encode_text called"))
+    second = embedding_service.embed_text(text)
+    
+    assert np.array_equal(second, first)
+    assert second.flags.writeable
+
+
+@pytest.mark.asyncio
+async def test_embed_query_disk_cache_off_event_loop(embedding_service, tmp_path, monkeypatch):
+    """Test that embed_query does its sqlite reads and writes off the event loop"""
+    import threading
+    
+    cache_db = embedding_service._open_cache_db(str(tmp_path / "embeddings.db"))
+    monkeypatch.setattr(embedding_service, "_cache_db", cache_db)
+    loop_thread = threading.current_thread()
+    disk_threads = []
+    
+    for name in ("_load_from_disk", "_save_to_disk"):
+        original = getattr(embedding_service, name)
+        
+        def spy(*args, original=original):
+            disk_threads.append(threading.current_thread())
+            return original(*args)
+        
+        monkeypatch.setattr(embedding_service, name, spy)
+    
+    first = await embedding_service.embed_query("A query cached on disk")
+    
+    # Restart: only the sqlite file is left
+    embedding_service._embed_text_cache.clear()
+    second = await embedding_service.embed_query("A query cached on disk")
+    
+    assert np.array_equal(second, first)
+    assert len(disk_threads) == 3  # Miss lookup, save, hit lookup
+    assert all(thread is not loop_thread for thread in disk_threads)
+
+
+def test_disk_cache_scoped_to_model_config(embedding_service):
+    """Test that disk cache rows are keyed by everything that changes the vectors"""
+    key = embedding_service._cache_db_model
+    
+    assert embedding_service.settings.embedding_model in key
+    assert (embedding_service.model_file or "pytorch") in key
+    assert embedding_service.device in key
+    assert f"max_seq_length={embedding_service.model.max_seq_length}" in key
 
 
 def test_embed_text_empty_string(embedding_service):
@@ -148,7 +243,7 @@ def test_embed_text_empty_string(embedding_service):
     
     # Should still return 384-dimensional vector
     assert len(embedding) == 384
-    assert isinstance(embedding, list)
+    assert isinstance(embedding, np.ndarray)
 
 
 def test_embed_text_long_text(embedding_service):
@@ -163,12 +258,13 @@ def test_embed_text_long_text(embedding_service):
 # Test embed_texts (Batch Processing)
 # ============================================================================
 
-def test_embed_texts_returns_list_of_lists(embedding_service, sample_texts):
-    """Test that embed_texts returns list of lists"""
+def test_embed_texts_returns_matrix(embedding_service, sample_texts):
+    """Test that embed_texts returns a 2-D float32 numpy array"""
     embeddings = embedding_service.embed_texts(sample_texts)
     
-    assert isinstance(embeddings, list)
-    assert all(isinstance(emb, list) for emb in embeddings)
+    assert isinstance(embeddings, np.ndarray)
+    assert embeddings.ndim == 2
+    assert embeddings.dtype == np.float32
 
 
 def test_embed_texts_correct_count(embedding_service, sample_texts):
@@ -190,7 +286,7 @@ def test_embed_texts_empty_list(embedding_service):
     """Test embedding empty list"""
     embeddings = embedding_service.embed_texts([])
     
-    assert embeddings == []
+    assert len(embeddings) == 0
 
 
 def test_embed_texts_single_text(embedding_service):
@@ -211,13 +307,31 @@ def test_embed_texts_many_texts(embedding_service):
     assert all(len(emb) == 384 for emb in embeddings)
 
 
+def test_embed_texts_encodes_only_uncached(embedding_service, sample_texts, monkeypatch):
+    """Test that embed_texts only sends texts missing from the cache to the model"""
+    cached = embedding_service.embed_text(sample_texts[0])
+    
+    encode = embedding_service.model.encode
+    encoded_texts = []
+    
+    def tracking_encode(texts, *args, **kwargs):
+        encoded_texts.extend(texts)
+        return encode(texts, *args, **kwargs)
+    
+    monkeypatch.setattr(embedding_service.model, "encode", tracking_encode)
+    embeddings = embedding_service.embed_texts(sample_texts)
+    
+    assert encoded_texts == sample_texts[1:]
+    assert np.array_equal(embeddings[0], cached)
+
+
 def test_embed_texts_normalized(embedding_service, sample_texts):
     """Test that batch embeddings are normalized"""
     embeddings = embedding_service.embed_texts(sample_texts)
     
-    for embedding in embeddings:
-        length = np.linalg.norm(embedding)
-        assert abs(length - 1.0) < 0.01
+    # One vectorised norm over the whole matrix
+    lengths = np.linalg.norm(embeddings, axis=1)
+    assert np.all(np.abs(lengths - 1.0) < 0.01)
 
 
 # ============================================================================
@@ -246,6 +360,40 @@ async def test_embed_chunks_adds_embeddings(embedding_service, sample_chunks):
     assert all(len(chunk.embedding) == 384 for chunk in result)
 
 
+@pytest.mark.asyncio
+async def test_embed_chunks_normalized(embedding_service, sample_chunks):
+    """Test that chunk embeddings are normalized like query embeddings"""
+    result = await embedding_service.embed_chunks(sample_chunks)
+    
+    # Chunk rows share one matrix, so check them in one pass
+    lengths = np.linalg.norm(result[0].embedding.base, axis=1)
+    assert np.all(np.abs(lengths - 1.0) < 0.01)
+
+
+@pytest.mark.asyncio
+async def test_embed_chunks_float32(embedding_service, sample_chunks):
+    """Test that chunk embeddings keep the float32 precision ChromaDB stores"""
+    result = await embedding_service.embed_chunks(sample_chunks)
+    
+    for chunk in result:
+        assert isinstance(chunk.embedding, np.ndarray)
+        assert chunk.embedding.dtype == np.float32
+
+
+@pytest.mark.asyncio
+async def test_embed_chunks_share_one_matrix(embedding_service, sample_chunks):
+    """Test that a document's chunk embeddings are rows of one float32 matrix"""
+    result = await embedding_service.embed_chunks(sample_chunks)
+    
+    matrix = result[0].embedding.base
+    assert isinstance(matrix, np.ndarray)
+    assert matrix.shape == (len(sample_chunks), 384)
+    assert matrix.flags.c_contiguous
+    for i, chunk in enumerate(result):
+        assert chunk.embedding.base is matrix
+        assert np.shares_memory(chunk.embedding, matrix[i])
+
+
 @pytest.mark.asyncio
 async def test_embed_chunks_preserves_text(embedding_service, sample_chunks):
     """Test that original text is preserved"""
@@ -290,6 +438,37 @@ async def test_embed_chunks_modifies_in_place(embedding_service, sample_chunks):
     assert original_chunk is result[0]
 
 
+@pytest.mark.asyncio
+async def test_embed_chunks_concurrent_documents(embedding_service):
+    """Test that concurrent documents each get back their own embeddings"""
+    docs = [
+        [
+            DocumentChunk(chunk_id=f"{doc}_chunk_{i}", document_id=doc, text=f"{doc} text {i}", chunk_index=i)
+            for i in range(n)
+        ]
+        for doc, n in [("doc_a", 3), ("doc_b", 5), ("doc_c", 1)]
+    ]
+    
+    results = await asyncio.gather(*(embedding_service.embed_chunks(chunks) for chunks in docs))
+    
+    for chunks in results:
+        for chunk in chunks:
+            expected = embedding_service.embed_text(chunk.text)
+            assert np.allclose(chunk.embedding, expected, atol=1e-5)  # Batched vs single-text encode
+
+
+@pytest.mark.asyncio
+async def test_embed_query_matches_embed_text(embedding_service):
+    """Test that concurrent queries are batched and match embed_text"""
+    questions = ["What is osmosis?", "Define entropy", "What is a ribosome?"]
+    
+    results = await asyncio.gather(*(embedding_service.embed_query(q) for q in questions))
+    
+    for question, embedding in zip(questions, results):
+        assert isinstance(embedding, np.ndarray)
+        assert np.allclose(embedding, embedding_service.embed_text(question), atol=1e-5)
+
+
 # ============================================================================
 # Test calculate_similarity
 # ============================================================================
@@ -325,6 +504,28 @@ def test_calculate_similarity_different_texts(embedding_service):
     assert similarity < 0.3
 
 
+def test_calculate_similarity_is_dot_product(embedding_service):
+    """Test that similarity is the plain dot product of the unit vectors"""
+    text1 = "Enzymes speed up reactions"
+    text2 = "Catalysts lower activation energy"
+    
+    expected = np.dot(embedding_service.embed_text(text1), embedding_service.embed_text(text2))
+    
+    assert embedding_service.calculate_similarity(text1, text2) == pytest.approx(float(expected), abs=1e-6)
+
+
+def test_calculate_similarity_uses_cache(embedding_service, monkeypatch):
+    """Test that texts embedded before don't go through the model again"""
+    first = embedding_service.calculate_similarity("The cell membrane", "The cell wall")
+    
+    # Neither the batch path nor the single-text path may run the model
+    monkeypatch.setattr(embedding_service.model, "encode", lambda *a, **kw: pytest.fail("encode called"))
+    monkeypatch.setattr(embedding_service, "_encode_text", lambda *a, **kw: pytest.fail("_encode_text called"))
+    second = embedding_service.calculate_similarity("The cell membrane", "The cell wall")
+    
+    assert second == pytest.approx(first)
+
+
 def test_calculate_similarity_returns_float(embedding_service):
     """Test that similarity returns a float"""
     similarity = embedding_service.calculate_similarity("test", "test")
@@ -334,15 +535,23 @@ def test_calculate_similarity_returns_float(embedding_service):
 
 def test_calculate_similarity_range(embedding_service, sample_texts):
     """Test that similarity is between 0 and 1"""
-    # Test various pairs
+    # Test every pair at once
+    similarities = embedding_service.pairwise_similarity(sample_texts)
+    
+    assert similarities.shape == (len(sample_texts), len(sample_texts))
+    # Allow small floating point errors (similarity might be 1.0000000637)
+    assert np.all(similarities >= -0.01), f"Similarity {similarities.min()} out of range"
+    assert np.all(similarities <= 1.01), f"Similarity {similarities.max()} out of range"
+
+
+def test_pairwise_similarity_matches_calculate_similarity(embedding_service, sample_texts):
+    """Test that pairwise_similarity agrees with calculate_similarity"""
+    similarities = embedding_service.pairwise_similarity(sample_texts)
+    
     for i in range(len(sample_texts)):
         for j in range(len(sample_texts)):
-            similarity = embedding_service.calculate_similarity(
-                sample_texts[i], 
-                sample_texts[j]
-            )
-            # Allow small floating point errors (similarity might be 1.0000000637)
-            assert -0.01 <= similarity <= 1.01, f"Similarity {similarity} out of range"
+            expected = embedding_service.calculate_similarity(sample_texts[i], sample_texts[j])
+            assert abs(similarities[i, j] - expected) < 1e-5
 
 
 
@@ -401,7 +610,7 @@ def test_embed_mixed_case(embedding_service):
     assert similarity > 0.95  # Very similar (or identical)
     
     # If they're not identical, verify they're at least very close
-    if embedding1 == embedding2:
+    if np.array_equal(embedding1, embedding2):
         # Model normalized the case - this is fine!
         assert True
     else:
@@ -431,7 +640,7 @@ async def test_full_workflow(embedding_service):
             chunk_index=0,
             start_char=0,
             end_char=41,
-            metadata=metadata
+            metadata=metadata.model_dump()
         ),
         DocumentChunk(
             chunk_id="chunk_1",
@@ -440,7 +649,7 @@ async def test_full_workflow(embedding_service):
             chunk_index=1,
             start_char=41,
             end_char=68,
-            metadata=metadata
+            metadata=metadata.model_dump()
         )
     ]
     
@@ -462,15 +671,35 @@ async def test_full_workflow(embedding_service):
 
 def test_batch_vs_single_consistency(embedding_service):
     """Test that batch processing gives same results as single processing"""
-    texts = ["Text one", "Text two", "Text three"]
+    # The last text is longer than max_seq_length, so truncation is covered
+    texts = ["Text one", "Text two", "Text three", "This is a sentence. " * 200]
     
     # Batch processing
     batch_embeddings = embedding_service.embed_texts(texts)
     
-    # Single processing
+    # Single processing - embed_texts filled the cache, so clear it or the
+    # single-text path would never run
+    embedding_service._embed_text_cache.clear()
     single_embeddings = [embedding_service.embed_text(text) for text in texts]
     
-    # Should be identical
+    # int8 exports quantize activations per batch (and FP16 on GPU rounds),
+    # so padding in the batch shifts values slightly; FP32 must match closely
+    low_precision = embedding_service.device == "cuda" or (
+        getattr(embedding_service.model, "backend", "torch") in ("onnx", "openvino")
+        and "qint8" in (embedding_service.model_file or "")
+    )
+    tolerance = 1e-3 if low_precision else 1e-5
+    
+    # Should be (nearly) identical
     for batch, single in zip(batch_embeddings, single_embeddings):
-        # Check if arrays are close (account for floating point precision)
-        assert np.allclose(batch, single, rtol=1e-5)
\ No newline at end of file
+        assert np.allclose(batch, single, rtol=tolerance, atol=tolerance)
+
+
+def test_encode_text_matches_model_encode(embedding_service):
+    """Test that the single-text path matches SentenceTransformer.encode"""
+    # Includes an empty text and one longer than max_seq_length
+    texts = ["Text one", "", "This is a sentence. " * 200]
+    
+    for text in texts:
+        expected = embedding_service.model.encode([text], normalize_embeddings=True)[0]
+        assert np.allclose(embedding_service._encode_text(text), expected, rtol=1e-5, atol=1e-6)
@@ -1,15 +1,18 @@
 # tests/test_models.py
 
 import pytest
+import numpy as np
 from datetime import datetime
 from backend.app.models import (
     FileType,
+    FILE_TYPE_BY_EXTENSION,
     DocumentMetaData,
     QueryRequest,
     UploadResponse,
     ErrorResponse,
     Source,
-    QueryResponse
+    QueryResponse,
+    DocumentChunk
 )
 from pydantic import ValidationError
 
@@ -22,6 +25,13 @@ def test_file_type_enum():
     assert FileType.TXT == "txt"
     assert FileType.DOCX == "docx"
 
+def test_file_type_by_extension():
+    """Test that the extension lookup maps to every FileType"""
+    assert FILE_TYPE_BY_EXTENSION["pdf"] is FileType.PDF
+    assert FILE_TYPE_BY_EXTENSION["txt"] is FileType.TXT
+    assert FILE_TYPE_BY_EXTENSION["docx"] is FileType.DOCX
+    assert FILE_TYPE_BY_EXTENSION.get("exe") is None
+
 # ============================================================================
 # Test DocumentMetaData
 # ============================================================================
@@ -212,6 +222,56 @@ def test_error_response_with_details():
     
     assert error.details["field"] == "question"
 
+# ============================================================================
+# Test DocumentChunk
+# ============================================================================
+def test_document_chunk_positions_are_ints():
+    """Test that chunk index and offsets are stored as ints"""
+    chunk = DocumentChunk(
+        chunk_id="chunk_0",
+        document_id="doc_1",
+        text="Some text",
+        chunk_index=0,
+        start_char=0,
+        end_char=9
+    )
+    
+    assert isinstance(chunk.chunk_index, int)
+    assert isinstance(chunk.start_char, int)
+    assert isinstance(chunk.end_char, int)
+
+def test_document_chunk_negative_positions():
+    """Test that negative indexes and offsets are rejected"""
+    with pytest.raises(ValidationError):
+        DocumentChunk(
+            chunk_id="chunk_0",
+            document_id="doc_1",
+            text="Some text",
+            chunk_index=-1
+        )
+    
+    with pytest.raises(ValidationError):
+        DocumentChunk(
+            chunk_id="chunk_0",
+            document_id="doc_1",
+            text="Some text",
+            chunk_index=0,
+            start_char=-5
+        )
+
+def test_document_chunk_accepts_ndarray_embedding():
+    """Test that embeddings can be kept as numpy arrays"""
+    embedding = np.zeros(384, dtype=np.float16)
+    chunk = DocumentChunk(
+        chunk_id="chunk_0",
+        document_id="doc_1",
+        text="Some text",
+        chunk_index=0,
+        embedding=embedding
+    )
+    
+    assert chunk.embedding is embedding
+
 # ============================================================================
 # Test JSON serialization
 # ============================================================================